@@ -26,6 +26,23 @@ from enum import IntEnum
 # -----------------------------------------------
 parsedH5 = []
 
+# chunk cache of the opened files, large enough to hold the DSUM of all PDCs
+H5_RDCC_NBYTES = 8*1024*1024
+H5_RDCC_NSLOTS = 100003 # prime number, fewer hash collisions
+H5_RDCC_W0 = 0.75
+# page buffer in MiB (PDC_H5_PAGE_BUF_MB), only used by files written with the paged
+# file space strategy, disabled by default
+H5_PAGE_BUF_SIZE = int(os.environ.get("PDC_H5_PAGE_BUF_MB", "0"))*1024*1024
+# load the whole file in memory at opening (PDC_H5_IN_MEMORY=1), one sequential read
+# instead of many small ones, for the small files of the tests
+H5_IN_MEMORY = os.environ.get("PDC_H5_IN_MEMORY", "0") == "1"
+
+# waitForNewFile: polling period, doubled up to its maximum while no file comes (seconds)
+H5_WAIT_POLL_MIN = 0.001
+H5_WAIT_POLL_MAX = 0.05
+# waitForNewFile: full scan period, for files filled after their creation (seconds)
+H5_WAIT_RESCAN_PRD = 0.5
+
 def dbgPrint(message, enabled=False):
     if enabled: print(message)
 
@@ -170,6 +187,10 @@ class h5Reader:
         # HDF5 members
         self.HDF_TRANSMIT = None
         self.HDF_CTL = None
+        # datasets of the Controller already opened, per path (see getCtlDset)
+        self.ctlDsets = {}
+        # data of the Controller loaded in memory, per path (see slurpCtl)
+        self.ctlData = {}
 
         # PDC settings
         self.sysClkPrd = sysClkPrd
@@ -207,13 +228,21 @@ class h5Reader:
         path: name of the path to look for files
         newFirst: True = New files first, Fale = Old files first
         """
-        #return sorted(Path(path).iterdir(), reverse=reverseOrder, key=os.path.getmtime)
-        if newFirst:
-            reverse=''
-        else:
-            reverse='r'
-        with os.popen(f"ls -1t{reverse} {path}/*.h5 2> /dev/null") as cmdFile:
-            return cmdFile.read().split()
+        # sorted as 'ls -1t path/*.h5', without starting a process
+        files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".h5") and not entry.name.startswith("."):
+                        try:
+                            files.append((-entry.stat().st_mtime_ns, entry.name))
+                        except OSError:
+                            # file removed while listing
+                            continue
+        except OSError:
+            return []
+        files.sort(reverse=not newFirst)
+        return [os.path.join(path, name) for _, name in files]
 
     def getLastH5(self):
         """
@@ -241,6 +270,15 @@ class h5Reader:
         # no new file to parse
         return ""
 
+    def hasNewFile(self):
+        """
+        look for a new file in the path if none is set, the reader is reused between files
+        returns true when the name of the file is set
+        """
+        if not self.newFileReady():
+            self.hfFile = self.getLastH5()
+        return self.newFileReady()
+
     def newFileReady(self):
         """
         returns true when the name of the file is set
@@ -251,15 +289,35 @@ class h5Reader:
             return True
         
     def waitForNewFile(self, timeout_sec=45):
-        start_time = time.time()
+        deadline = time.monotonic() + timeout_sec
         self.hfFile = self.getLastH5()
-
-        while self.hfFile == "" and time.time() - start_time < timeout_sec :
-            time.sleep(1)
-            self.hfFile = self.getLastH5()
+        dirStamp = self._dirStamp()
+        lastScan = time.monotonic()
+        pollPrd = H5_WAIT_POLL_MIN
+
+        while self.hfFile == "" and time.monotonic() < deadline:
+            time.sleep(pollPrd)
+            pollPrd = min(2*pollPrd, H5_WAIT_POLL_MAX)
+            # the directory is only listed when changed (a file created, renamed or
+            # deleted changes its mtime), with a full scan every H5_WAIT_RESCAN_PRD
+            newStamp = self._dirStamp()
+            now = time.monotonic()
+            if newStamp is None or newStamp != dirStamp or now - lastScan >= H5_WAIT_RESCAN_PRD:
+                dirStamp = newStamp
+                lastScan = now
+                self.hfFile = self.getLastH5()
 
         return self.hfFile
 
+    def _dirStamp(self):
+        """
+        modification time of the HDF5 directory, None if not available
+        """
+        try:
+            return os.stat(self.hdf5_path).st_mtime_ns
+        except OSError:
+            return None
+
 
     def h5Open(self):
         """
@@ -267,7 +325,19 @@ class h5Reader:
         """
         if self.h5 == None:
             dbgPrint(f"Opening file {self.hfFile}")
-            self.h5 = h5py.File(self.hfFile, 'r+')
+            # the files are only read
+            kwargs = {}
+            if H5_IN_MEMORY:
+                # core driver, the file is not written back
+                kwargs["driver"] = "core"
+                kwargs["backing_store"] = False
+            elif H5_PAGE_BUF_SIZE > 0:
+                kwargs["page_buf_size"] = H5_PAGE_BUF_SIZE
+            self.h5 = h5py.File(self.hfFile, 'r',
+                                rdcc_nbytes=H5_RDCC_NBYTES,
+                                rdcc_nslots=H5_RDCC_NSLOTS,
+                                rdcc_w0=H5_RDCC_W0,
+                                **kwargs)
         return self.h5 != None
 
     def h5Close(self):
@@ -278,6 +348,11 @@ class h5Reader:
             dbgPrint(f"Closing file {self.hfFile}")
             self.h5.close()
             self.h5 = None
+            # groups and datasets of the closed file
+            self.HDF_TRANSMIT = None
+            self.HDF_CTL = None
+            self.ctlDsets.clear()
+            self.ctlData.clear()
         if self.deleteAfter and os.path.isfile(self.hfFile):
             dbgPrint(f"Deleting file {self.hfFile}")
             os.remove(self.hfFile)
@@ -297,25 +372,124 @@ class h5Reader:
                     self.HDF_CTL = self.HDF_TRANSMIT.get(key)
         return self.HDF_CTL != None
 
-    def getPdcDsum(self, iPdc):
+    def getCtlDset(self, path):
+        """
+        get a dataset of the Controller, its path is resolved only once per file
+        return None if not found
+        """
+        dset = self.ctlDsets.get(path)
+        if dset is None and self.h5GetCtl():
+            dset = self.HDF_CTL.get(path)
+            if dset is not None:
+                self.ctlDsets[path] = dset
+        return dset
+
+    def slurpCtl(self, groups=("",)):
+        """
+        load all the numeric datasets below the groups of the Controller in memory,
+        read back to back in a single buffer, readMany then reads from memory
+        groups: paths of the groups relative to the Controller, the whole Controller by default
+        return the number of bytes loaded
+        """
+        if not self.h5GetCtl():
+            print(f"ERROR: no Controller found")
+            return 0
+        dsets = []
+        def addDset(name, obj):
+            if isinstance(obj, h5py.Dataset) and obj.dtype.kind in "biuf":
+                dsets.append((name, obj))
+        for group in groups:
+            ctlGroup = self.HDF_CTL if group == "" else self.HDF_CTL.get(group)
+            if isinstance(ctlGroup, h5py.Group):
+                prefix = "" if group == "" else f"{group.strip('/')}/"
+                ctlGroup.visititems(lambda name, obj: addDset(f"{prefix}{name}", obj))
+
+        # offsets aligned on 8 bytes for the views of each dataset
+        offsets = []
+        total = 0
+        for name, dset in dsets:
+            offsets.append(total)
+            total += -(-dset.size*dset.dtype.itemsize // 8)*8
+        buf = np.empty(total, dtype=np.uint8)
+        for (name, dset), offset in zip(dsets, offsets):
+            data = buf[offset:offset + dset.size*dset.dtype.itemsize].view(dset.dtype).reshape(dset.shape)
+            if data.size > 0:
+                dset.read_direct(data)
+            self.ctlData[name] = data
+            self.ctlDsets[name] = dset
+        dbgPrint(f"Loaded {len(dsets)} datasets ({total} bytes) of the Controller")
+        return total
+
+    def getPdcDsum(self, iPdc, out=None):
         """
         extract the digital sum data from the HDF5 database
+        out: optional np.uintc buffer receiving the data, used when its size matches
         """
         self.h5GetCtl()
         if self.HDF_CTL == None:
             # no Controller in the file
             print(f"ERROR: no Controller found")
             return [None, None]
-        PDC_DSUM = self.HDF_CTL.get(f"PDC/PDC_{iPdc:02d}/PDC_DATA/DGTL_SUM/DGTL_SUM")
+        PDC_DSUM = self.getCtlDset(f"PDC/PDC_{iPdc:02d}/PDC_DATA/DGTL_SUM/DGTL_SUM")
         if PDC_DSUM == None:
             #print(f"ERROR: no PDC DGTL_SUM found for PDC {iPdc}")
             return [None, None]
         dbgPrint(f"  Found DGTL_SUM for PDC {iPdc}")
 
-        data = np.array(PDC_DSUM[:], dtype=np.uintc)
+        # single contiguous read of the whole dataset directly into the buffer
+        if out is None or out.shape != PDC_DSUM.shape or out.dtype != np.uintc:
+            out = np.empty(PDC_DSUM.shape, dtype=np.uintc)
+        if out.size > 0:
+            PDC_DSUM.read_direct(out)
+        data = out
         time = np.arange(0, len(data), 1)*self.dsumPrd
         return [time, data]
 
+    def getAllPdcDsum(self, nPdc, out=None):
+        """
+        extract the digital sum data of PDCs 0 to nPdc-1 (see getPdcDsum)
+        out: optional np.uintc buffer with one row per PDC
+        """
+        self.h5GetCtl()
+        if self.HDF_CTL == None:
+            # no Controller in the file, reported once for all PDCs
+            print(f"ERROR: no Controller found")
+            return [[None, None] for iPdc in range(nPdc)]
+        return [self.getPdcDsum(iPdc=iPdc, out=None if out is None else out[iPdc])
+                for iPdc in range(nPdc)]
+
+    def readMany(self, names, out=None):
+        """
+        read the datasets of the Controller group listed in names, one read per dataset
+        out: optional buffer with one row per name, by default allocated once from the
+             first dataset found, datasets of another shape or type get their own array
+        the datasets loaded by slurpCtl are returned from memory, without copy
+        return a dict of the data per name, None for the missing datasets
+        """
+        self.h5GetCtl()
+        if self.HDF_CTL == None:
+            # no Controller in the file
+            print(f"ERROR: no Controller found")
+            return {name: None for name in names}
+        data = {}
+        for iName, name in enumerate(names):
+            if name in self.ctlData:
+                data[name] = self.ctlData[name]
+                continue
+            dset = self.getCtlDset(name)
+            if dset == None:
+                data[name] = None
+                continue
+            if out is None:
+                out = np.empty((len(names),) + dset.shape, dtype=dset.dtype)
+            buf = out[iName]
+            if buf.shape != dset.shape or buf.dtype != dset.dtype:
+                buf = np.empty(dset.shape, dtype=dset.dtype)
+            if buf.size > 0:
+                dset.read_direct(buf)
+            data[name] = buf
+        return data
+
     # Function to get data from HDF5 file
     def getPdcZPP(self, iPdc, zppSingle: PDC_ZPP_ITEM=None, zppList: list=None)-> PDC_ZPP:
         zppParam = []
@@ -343,7 +517,7 @@ class h5Reader:
         for param in zppParam:
             paramName=PDC_ZPP_NAME[param]
             #print(f"param={paramName}")
-            ZPP.setItem(param, self.HDF_CTL.get(f"PDC/PDC_{iPdc:02d}/PDC_DATA/ZPP/{paramName}"))
+            ZPP.setItem(param, self.getCtlDset(f"PDC/PDC_{iPdc:02d}/PDC_DATA/ZPP/{paramName}"))
 
         #ZPP = self.HDF_CTL.get(f"PDC/PDC_{iPdc:02d}/PDC_DATA/ZPP/{param}")
         if ZPP.isEmpty():
@@ -352,6 +526,18 @@ class h5Reader:
         dbgPrint(f"  Found ZPP for PDC {iPdc}")
         return ZPP
 
+    def getAllPdcZPP(self, nPdc, zppSingle: PDC_ZPP_ITEM=None, zppList: list=None) -> list:
+        """
+        extract the ZPP data of PDCs 0 to nPdc-1 (see getPdcZPP)
+        """
+        self.h5GetCtl()
+        if self.HDF_CTL == None:
+            # no Controller in the file, reported once for all PDCs
+            print(f"ERROR: no Controller found")
+            return [None]*nPdc
+        return [self.getPdcZPP(iPdc=iPdc, zppSingle=zppSingle, zppList=zppList)
+                for iPdc in range(nPdc)]
+
 
 
 
@@ -70,6 +70,10 @@ class OUT_MUX(IntEnum):
 
 # PDC settings (for reference only)
 class pdc_setting:
+    # fixed set of registers, stored in slots instead of a per-instance dict
+    __slots__ = ("PIXL", "TIME", "ANLG", "STHH", "STHL", "ACQA", "ACQB",
+                 "DBGC", "FIFO", "DTXC", "OUTD", "OUTF", "OUTC", "TRGC")
+
     def __init__():
         self.PIXL=0x1100
         self.TIME=0xDEDE
@@ -116,10 +120,11 @@ class pdc_setting:
         self.TRGC=TRGC
 
     def print(self, sel="ALL"):
-        attrs = vars(self)
-        for item in attrs.items():
-            if (sel == "ALL" or sel == item[0]):
-                print(f"{item[0]} = 0x{item[1]:04x}")
+        # all lines in a single write
+        lines = [f"{name} = 0x{getattr(self, name):04x}" for name in self.__slots__
+                 if (sel == "ALL" or sel == name)]
+        if lines:
+            print("\n".join(lines))
 
     def apply(self, session):
         cmd = ""
@@ -144,6 +149,37 @@ class pdc_setting:
 
 
 
+# last value written to each PDC register
+class pdc_reg_cache:
+    def __init__(self, verify=False):
+        """
+        verify: True to read back the registers (-g) after each write
+        """
+        self.verify = verify
+        self.regs = {}
+
+    def cfgCmd(self, reg: str, value: int) -> str:
+        """
+        pdcCfg command writing value to register reg of the enabled PDCs
+        """
+        self.regs[reg] = value
+        if self.verify:
+            return _PDCCFG_TMPL(name=reg, val=value)
+        return _PDCCFG_SET_TMPL(name=reg, val=value)
+
+    def cfgCmds(self, regs: dict) -> list:
+        """
+        pdcCfg commands writing all the {register: value} of regs, in order
+        """
+        return [self.cfgCmd(reg, value) for reg, value in regs.items()]
+
+    def get(self, reg: str) -> int:
+        """
+        last value written to register reg, None if never written
+        """
+        return self.regs.get(reg)
+
+
 # ---------------------
 # ----- FUNCTIONS -----
 # ---------------------
@@ -158,6 +194,36 @@ def setPdcTimeReg(hold: int, rech: int, flag: int) -> int:
     REG += ((flag&0x1F)<<11)
     return REG
 
+def setPdcPixlReg(activeQcEn: int=1, trgDgtlFen: int=0, flagEn: int=1,
+                  edgeLvln: int=0, disMem: int=0) -> int:
+    """
+    PIXL register value from its fields
+    """
+    REG = 0
+    REG += ((activeQcEn&0x1)<<1)
+    REG += ((trgDgtlFen&0x1)<<4)
+    REG += ((flagEn&0x1)<<8)
+    REG += ((edgeLvln&0x1)<<12)
+    REG += ((disMem&0x1)<<13)
+    return REG
+
+def setPdcOutReg(lowFunc: OUT_MUX, highFunc: OUT_MUX) -> int:
+    """
+    OUTD, OUTF or OUTC register value from the functions of its two outputs
+    """
+    return (lowFunc & 0x1F) + ((highFunc & 0x1F)<<6)
+
+# pdcCfg command templates of pdc_reg_cache, parsed once
+_PDCCFG_TMPL = "pdcCfg -a {name} -r 0x{val:04x} -g".format
+_PDCCFG_SET_TMPL = "pdcCfg -a {name} -r 0x{val:04x}".format
+
+def pdcPixEnCmds(pixIndices, mode="NONE") -> list:
+    """
+    pdcPix commands enabling each pixel of pixIndices,
+    to send together in a single remote shell (e.g. sshClient.runBatchReturn)
+    """
+    return [f"pdcPix --index {pixIndex} --mode {mode}" for pixIndex in pixIndices]
+
 def setPDCTime(hold_ns:float, rech_ns: float, flag: float, session):
     """
     Input as ns
@@ -12,6 +12,9 @@
 #-- Additional Comments:
 #----------------------------------------------------------------------------------
 import os
+import socket
+import functools
+import subprocess
 from pssh.clients import SSHClient
 import time
 
@@ -22,15 +25,55 @@ from os.path import expanduser
 # custom modules
 from modules.fgColors import fgColors
 
+# share an OpenSSH master connection between the scripts with PDC_SSH_SHARED=1 (see sshClientFromCfg)
+SSH_SHARED = os.environ.get("PDC_SSH_SHARED") == "1"
+# socket of the master connection, also written in the host entry of ~/.ssh/config by setupHosts/setup.sh
+SSH_SHARED_CONTROL_PATH = "~/.ssh/pdc-%r@%h:%p"
+SSH_SHARED_PERSIST = "30m"
+# cipher preference of the shared connection, e.g. PDC_SSH_CIPHERS=^chacha20-poly1305@openssh.com
+# to try ChaCha20 first (cheaper than AES on cores without crypto extensions), ssh default if unset
+SSH_SHARED_CIPHERS = os.environ.get("PDC_SSH_CIPHERS")
+
+# keepalive period of the sessions (seconds), keeps the long lived sessions open
+SSH_KEEPALIVE_SEC = 30
+
+# line echoed after each command of runBatchReturn to split the output
+BATCH_MARKER = "###PDC_BATCH_CMD###"
+
 # class to deal with functions
 class sshClient:
     # -----------------------------------------------
     # --- constructor
     # -----------------------------------------------
     def __init__(self, host, user, password):
-        self.client = SSHClient(host=host, user=user, password=password)
+        self.client = self._connect(host=host, user=user, password=password)
     def __del__(self):
-        self.client.disconnect()
+        self.close()
+
+    # to use the client in a 'with' statement, closed at the end of the block
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # function to close the ssh session, the client can not be used afterwards
+    def close(self):
+        client = getattr(self, "client", None)
+        if client is not None:
+            client.disconnect()
+            # releasing the last reference ends the session
+            self.client = None
+
+    # function to open the ssh session
+    # compression reduces the size of the text status replies on slow links
+    # TCP_NODELAY avoids Nagle delays on the many small ctlCfg/ctlCmd commands
+    @staticmethod
+    def _connect(**kwargs):
+        client = SSHClient(compress=True, keepalive_seconds=SSH_KEEPALIVE_SEC, **kwargs)
+        if client.sock is not None:
+            client.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return client
 
     # -----------------------------------------------
     # --- functions
@@ -52,6 +95,47 @@ class sshClient:
         #exit_code = host_out.exit_code
         return host_out.exit_code
 
+    # function to send several commands in a single remote shell and display the result
+    # the commands and the result are each displayed in a single write
+    def runBatch(self, cmds, printCmd=True):
+        if printCmd and cmds:
+            print("\n".join(cmds))
+        host_out = self.client.run_command("\n".join(cmds))
+        lines = list(host_out.stdout)
+        if lines:
+            print("\n".join(lines))
+        return host_out.exit_code
+
+    # function to send several commands in a single remote shell and return the result of each one
+    # a marker line is echoed after each command to split the output, the result of each command
+    # is displayed after it, as with runPrint
+    def runBatchReturn(self, cmds, printCmd=True) -> list:
+        script = "\n".join(f"{cmd}\necho '{BATCH_MARKER}'" for cmd in cmds)
+        host_out = self.client.run_command(script)
+        rtnStr = [[] for cmd in cmds]
+        iCmd = 0
+        for line in host_out.stdout:
+            if BATCH_MARKER in line:
+                # output of the command may not end with a new line
+                before = line.split(BATCH_MARKER)[0]
+                if before and iCmd < len(cmds):
+                    rtnStr[iCmd].append(before)
+                iCmd += 1
+            elif iCmd < len(cmds):
+                rtnStr[iCmd].append(line)
+        if printCmd and cmds:
+            print("\n".join(line for cmd, lines in zip(cmds, rtnStr) for line in [cmd] + lines))
+        return rtnStr
+
+    # function to send several commands over the same session and return their results as lists of strings
+    # all commands are started before reading any output, so their round-trips overlap
+    def runMany(self, cmds, printCmd=True) -> list:
+        if printCmd:
+            for cmd in cmds:
+                print(cmd)
+        host_outs = [self.client.run_command(cmd) for cmd in cmds]
+        return [list(host_out.stdout) for host_out in host_outs]
+
     # function to send a command and display the result and sleep
     def runSleep(self, cmd, msSleep: float):
         host_out = self.client.run_command(cmd)
@@ -100,61 +184,179 @@ class sshClient:
         return self.client.run_command(cmd)
 
 
+# -----------------------------------------------
+# --- OpenSSH connection shared between scripts
+# -----------------------------------------------
+class sharedOutput:
+    """
+    output of a command run by sharedSession, with the members of pssh HostOutput used here
+    """
+    def __init__(self, proc):
+        self.proc = proc
+        self.lines = None
+        self.errLines = None
+
+    def _wait(self):
+        # both outputs are read together, a full pipe can not block the command
+        if self.lines is None:
+            out, err = self.proc.communicate()
+            self.lines = out.splitlines()
+            self.errLines = err.splitlines()
+
+    @property
+    def stdout(self):
+        self._wait()
+        return iter(self.lines)
+
+    @property
+    def stderr(self):
+        self._wait()
+        return iter(self.errLines)
+
+    @property
+    def exit_code(self):
+        self._wait()  # wait for the end of the command
+        return self.proc.returncode
+
+class sharedSession:
+    """
+    run the commands with the OpenSSH client through a master connection kept in background,
+    the next scripts reuse it without a new TCP connection, key exchange and authentication
+    """
+    def __init__(self, hostCfgName, cfgFile):
+        self.host = hostCfgName
+        self.sshArgs = ["ssh", "-F", expanduser(cfgFile),
+                        "-o", "BatchMode=yes",
+                        "-o", "ControlMaster=auto",
+                        "-o", f"ControlPersist={SSH_SHARED_PERSIST}"]
+        # the ControlPath of the host entry is kept, the master is then shared with 'ssh <host>'
+        if hostControlPath(hostCfgName=hostCfgName, cfgFile=cfgFile) is None:
+            self.sshArgs += ["-o", f"ControlPath={SSH_SHARED_CONTROL_PATH}"]
+        if SSH_SHARED_CIPHERS:
+            self.sshArgs += ["-o", f"Ciphers={SSH_SHARED_CIPHERS}"]
+        self.sshArgs.append(hostCfgName)
+
+    def connect(self) -> bool:
+        # starts the master connection if none is running
+        try:
+            return subprocess.run(self.sshArgs + ["true"], stdin=subprocess.DEVNULL).returncode == 0
+        except OSError:
+            return False
+
+    def run_command(self, cmd):
+        # started here, the output is read when used, as with pssh
+        proc = subprocess.Popen(self.sshArgs + [cmd],
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                text=True)
+        return sharedOutput(proc)
+
+    def disconnect(self):
+        # the master connection is kept for the next scripts (ControlPersist)
+        pass
+
+
+# ControlPath of a host in the ssh configuration file, None if not set
+@functools.lru_cache(maxsize=8)
+def hostControlPath(hostCfgName="zcudev", cfgFile="~/.ssh/config"):
+    try:
+        return read_ssh_config(expanduser(cfgFile)).host(hostCfgName).get("controlpath")
+    except (FileNotFoundError, KeyError):
+        return None
+
+
+# settings of a host in the ssh configuration file, parsed once per host and file
+@functools.lru_cache(maxsize=8)
+def resolveHostCfg(hostCfgName="zcudev", cfgFile="~/.ssh/config"):
+    """
+    return (host, user, pkey) of hostCfgName in cfgFile, with defaults when not found
+    """
+    # warning color
+    errorLevel = "WARNING"
+    errorColor = fgColors.red
+    warningColor = fgColors.yellow
+    # default host settings
+    host = '102.180.0.16'
+    user = 'zynq'
+    pkey = None
+
+    # try to get settings from config file
+    #cfgFile = "~/.ssh/config"
+    try:
+        userSshCfg = read_ssh_config(expanduser(cfgFile))
+        hostCfg = userSshCfg.host(hostCfgName)
+        if hostCfg == {}:
+            print(f"{errorColor}{errorLevel}:\n"
+                  f"    {hostCfgName} does not exists in {cfgFile}\n"
+                  f"    Review your '{cfgFile}' file.\n"
+                  f"    Using default host '{host}' and default user '{user}'\n"
+                  f"{fgColors.endc}")
+        else:
+            # normal execution
+            host = hostCfg['hostname']
+            user = hostCfg['user']
+            try:
+                pkey = hostCfg['identityfile']
+            except KeyError as ex:
+                print(f"{warningColor}WARNING: 'IdentityFile' not set in {cfgFile}")
+                if (os.path.isfile("~/.ssh/id_rsa_zcu")):
+                    # added in setup.sh script
+                    pkey = "~/.ssh/id_rsa_zcu"
+                else:
+                    # fall back file
+                    print(f"{warningColor}WARNING:\n"
+                          f"    '~/.ssh/id_rsa_zcu' does not exists\n"
+                          f"    Have you run 'setup.sh' script on your host ?\n"
+                          f"    Using default '~/.ssh/id_rsa'"
+                          f"{fgColors.endc}")
+                    pkey = "~/.ssh/id_rsa"
+    except FileNotFoundError:
+        print(f"{errorColor}{errorLevel}:\n"
+              f"    {cfgFile} does not exists\n"
+              f"    Create your '{cfgFile}' file."
+              f"{fgColors.endc}")
+    except KeyError:
+        print(f"{errorColor}{errorLevel}:\n"
+              f"    {hostCfgName} settings must include 'hostname', 'user' and 'identityfile'\n"
+              f"    Review your '{cfgFile}' file."
+              f"{fgColors.endc}")
+    return host, user, pkey
+
+
 # class to deal with functions
 class sshClientFromCfg(sshClient):
     def __init__(self,
                  hostCfgName="zcudev",
-                 cfgFile="~/.ssh/config"):
-        # warning color
-        errorLevel = "WARNING"
-        errorColor = fgColors.red
+                 cfgFile="~/.ssh/config",
+                 shared=SSH_SHARED):
         warningColor = fgColors.yellow
-        # default host settings
-        self.host = '102.180.0.16'
-        self.user = 'zynq'
-
-        # try to get settings from config file
-        #cfgFile = "~/.ssh/config"
-        try:
-            userSshCfg = read_ssh_config(expanduser(cfgFile))
-            hostCfg = userSshCfg.host(hostCfgName)
-            if hostCfg == {}:
-                print(f"{errorColor}{errorLevel}:\n"
-                      f"    {hostCfgName} does not exists in {cfgFile}\n"
-                      f"    Review your '{cfgFile}' file.\n"
-                      f"    Using default host '{self.host}' and default user '{self.user}'\n"
-                      f"{fgColors.endc}")
-            else:
-                # normal execution
-                self.host = hostCfg['hostname']
-                self.user = hostCfg['user']
-                try:
-                    self.pkey = hostCfg['identityfile']
-                except KeyError as ex:
-                    print(f"{warningColor}WARNING: 'IdentityFile' not set in {cfgFile}")
-                    if (os.path.isfile("~/.ssh/id_rsa_zcu")):
-                        # added in setup.sh script
-                        self.pkey = "~/.ssh/id_rsa_zcu"
-                    else:
-                        # fall back file
-                        print(f"{warningColor}WARNING:\n"
-                              f"    '~/.ssh/id_rsa_zcu' does not exists\n"
-                              f"    Have you run 'setup.sh' script on your host ?\n"
-                              f"    Using default '~/.ssh/id_rsa'"
-                              f"{fgColors.endc}")
-                        self.pkey = "~/.ssh/id_rsa"
-        except FileNotFoundError:
-            print(f"{errorColor}{errorLevel}:\n"
-                  f"    {cfgFile} does not exists\n"
-                  f"    Create your '{cfgFile}' file."
-                  f"{fgColors.endc}")
-        except KeyError:
-            print(f"{errorColor}{errorLevel}:\n"
-                  f"    {hostCfgName} settings must include 'hostname', 'user' and 'identityfile'\n"
-                  f"    Review your '{cfgFile}' file."
-                  f"{fgColors.endc}")
+        self.host, self.user, self.pkey = resolveHostCfg(hostCfgName=hostCfgName, cfgFile=cfgFile)
 
         # open client
         print(f"Connecting to '{hostCfgName}': host '{self.host}' with user '{self.user}'")
-        self.client = SSHClient(host=self.host, user=self.user, pkey=self.pkey)
+        if shared:
+            session = sharedSession(hostCfgName=hostCfgName, cfgFile=cfgFile)
+            if session.connect():
+                self.client = session
+                return
+            print(f"{warningColor}WARNING: unable to share an OpenSSH connection to '{hostCfgName}', "
+                  f"using a new session{fgColors.endc}")
+        self.client = self._connect(host=self.host, user=self.user, pkey=self.pkey)
     # others methods are inherited from sshClient
+
+
+# clients opened by sharedClientFromCfg, per host and configuration file
+_sharedClients = {}
+
+def sharedClientFromCfg(hostCfgName="zcudev", cfgFile="~/.ssh/config"):
+    """
+    return the client of hostCfgName reused by all the callers of the process
+    (e.g. successive test classes), a new one is opened if it was closed
+    """
+    key = (hostCfgName, cfgFile)
+    client = _sharedClients.get(key)
+    if client is None or client.client is None:
+        client = sshClientFromCfg(hostCfgName=hostCfgName, cfgFile=cfgFile)
+        _sharedClients[key] = client
+    return client
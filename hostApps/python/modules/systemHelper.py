@@ -11,16 +11,18 @@
 #-- Revision 1.0 - File Created
 #-- Additional Comments:
 #----------------------------------------------------------------------------------
+import os
 import subprocess
 import sys
 import traceback
 from modules.fgColors import fgColors
 
+# informational messages are only printed with PDC_VERBOSE=1 in the environment
+VERBOSE = os.environ.get("PDC_VERBOSE") == "1"
+
 def sectionPrint(msg):
-    print('')
-    print('-'*50)
-    print(f"--- {msg}")
-    print('-'*50)
+    # single write for the whole header
+    print(f"\n{'-'*50}\n--- {msg}\n{'-'*50}")
 
 def printException(ex):
     # Get current system exception
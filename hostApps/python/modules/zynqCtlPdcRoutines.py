@@ -12,16 +12,33 @@
 #-- Additional Comments:
 #----------------------------------------------------------------------------------
 import sys
-import numpy as np
 import math
 from enum import IntEnum
 from typing import Literal
+from contextlib import contextmanager
 
 # custom modules
 from modules.systemHelper import sectionPrint
 from modules.fgColors import fgColors
 import modules.sshClientHelper as sshClientHelper
 
+# registers allowed in setupFSM, with their ctlCfg command, built once at import
+FSM_CMD_TEMPLATES = {reg: f"ctlCfg -a {reg} -r 0x{{:04x}} -g" for reg in (
+    "TOUT",
+    "FEND",
+    "FTX1",
+    "FTX0",
+    "ATX1",
+    "ATX0",
+    "SLW1",
+    "SLW0",
+    "FST1",
+    "FST0",
+    "FACQ",
+    "FSMM",
+    "MISC",
+)}
+
 class packetBank(IntEnum):
     BANKA = 0
     BANKB = 1
@@ -45,28 +62,81 @@ class initCtlPdcFromClient():
         self.client = client
         self.sysClkPrd = sysClkPrd
 
-        self.client.runPrint(cmd=f"boardInfo -l", printCmd=False)
+        # board info and maximum number of PDCs, both requested over the same ssh session
+        boardInfo, numAsic = self.client.runMany(["boardInfo -l", "boardInfo --numasic --raw"], printCmd=False)
+        for line in boardInfo:
+            print(line)
 
         # requested by user, might change depending on hardware settings
         self.pdcEnUser = pdcEn
-        self.nPdcEnUser = bin(self.pdcEnUser).count("1") # NOTE property/setter
 
         # maximum number of PDCs
-        self.nPdcMax = self.client.runReturnInt(cmd=f"boardInfo --numasic --raw", printCmd=False)
+        self.nPdcMax = int(numAsic[0], base=0)  # automatic base
 
         # number of SPADs available per PDC
         self.nSpad = 64
 
+        # board topology, read once from the Zynq when first needed
+        self._numDelayLines = {}  # number of delay lines per signal
+        self._nCfgRtnEn = None    # number of CFG_RTN_EN lines
+
         # Controller packet settigns
         self.PACK_A = packetSettings()
         self.PACK_B = packetSettings()
 
+        # write commands are queued here while batching, see flush()
+        self._batching = False
+        self._pendingCmds = []
+
     def print(self):
         print(f"sysClkPrd = {self.sysClkPrd} sec ({self.sysClkPrdNs} ns)")
         print(f"pdcEnUser = 0x{self.pdcEnUser:X}")
         print(f"nPdcMax = {self.nPdcMax}")
         print(f"nSpad = {self.nSpad}")
 
+    def _run(self, cmd):
+        """
+        send a write command to the Zynq, or queue it while batching
+        """
+        if self._batching:
+            self._pendingCmds.append(cmd)
+        else:
+            self.client.runPrint(cmd)
+
+    def run(self, cmd):
+        """
+        send a command to the Zynq in order with the controller commands,
+        queued while batching (e.g. session of pdc_setting.apply)
+        """
+        self._run(cmd)
+
+    def flush(self):
+        """
+        send all queued commands to the Zynq in a single remote shell
+        must be called before reading back a value from the Zynq
+        """
+        if self._pendingCmds:
+            cmds, self._pendingCmds = self._pendingCmds, []
+            self.client.runBatch(cmds)
+
+    @contextmanager
+    def batch(self):
+        """
+        queue all write commands in the block and send them in a single remote shell at the end
+        reads in the block (e.g. checkPowerGood) send the queued commands first
+        """
+        if self._batching:
+            # already in a batch, the outer block sends the commands
+            yield self
+            return
+        self._batching = True
+        try:
+            yield self
+            self.flush()
+        finally:
+            self._batching = False
+            self._pendingCmds = []
+
     @property
     def sysClkPrd(self):
         return self._sysClkPrd
@@ -74,7 +144,19 @@ class initCtlPdcFromClient():
     @sysClkPrd.setter
     def sysClkPrd(self, clkPrd):
         self._sysClkPrd = clkPrd
-        self.sysClkPrdNs = int(np.round(self.sysClkPrd*1e9, 0))
+        self.sysClkPrdNs = round(self._sysClkPrd*1e9)
+
+    @property
+    def pdcEnUser(self):
+        return self._pdcEnUser
+
+    @pdcEnUser.setter
+    def pdcEnUser(self, pdcEn):
+        # derived values are computed once here instead of on every use
+        self._pdcEnUser = pdcEn
+        self._pdcEnLow = pdcEn & 0xFFFF
+        self._pdcEnHigh = (pdcEn >> 16) & 0xFFFF
+        self.nPdcEnUser = bin(pdcEn).count("1")
 
     def setSysClkPrd(self, sysClkPrd=None):
         """
@@ -87,7 +169,7 @@ class initCtlPdcFromClient():
             # using setting
             self.sysClkPrd = sysClkPrd
 
-        self.client.runPrint(f"clkSet -P {self.sysClkPrdNs} --ns")
+        self._run(f"clkSet -P {self.sysClkPrdNs} --ns")
 
     def resetCtl(self):
         """
@@ -95,7 +177,7 @@ class initCtlPdcFromClient():
         does not reset the PDCs
         """
         sectionPrint("reset of the controller")
-        self.client.runPrint('ctlCmd -c RSTN_FULL')
+        self._run('ctlCmd -c RSTN_FULL')
 
     def resetCtlFSM(self):
         """
@@ -103,21 +185,21 @@ class initCtlPdcFromClient():
         does not reset the PDCs
         """
         sectionPrint("reset of the controller")
-        self.client.runPrint('ctlCmd -c RSTN_SYS')
+        self._run('ctlCmd -c RSTN_SYS')
 
     def resetPDCSYS(self):
         """
         full reset of the PDC
         """
         sectionPrint("reset of the PDC SYSTEM")
-        self.client.runPrint('ctlCmd -c PDC_RSTN_SYS')
+        self._run('ctlCmd -c PDC_RSTN_SYS')
 
     def resetCtlZPP(self):
         """
         Reset of the ZPP module
         """
         sectionPrint("reset of the Controller ZPP module")
-        self.client.runPrint("ctlCmd -c RSTN_ZPP")
+        self._run("ctlCmd -c RSTN_ZPP")
         
 
     def setCtlPacket(self, bank: packetBank, SCS=None, SCD=None, SPD=None):
@@ -149,9 +231,9 @@ class initCtlPdcFromClient():
             pack.SPD = SPD
 
         # sending settings to Controller
-        self.client.runPrint(f"ctlCfg -a SCS{bankName} -r 0x{pack.SCS:04x} -g")
-        self.client.runPrint(f"ctlCfg -a SCD{bankName} -r 0x{pack.SCD:04x} -g")
-        self.client.runPrint(f"ctlCfg -a SPD{bankName} -r 0x{pack.SPD:04x} -g")
+        self._run(f"ctlCfg -a SCS{bankName} -r 0x{pack.SCS:04x} -g")
+        self._run(f"ctlCfg -a SCD{bankName} -r 0x{pack.SCD:04x} -g")
+        self._run(f"ctlCfg -a SPD{bankName} -r 0x{pack.SPD:04x} -g")
 
     def setDelay(self, signal, delay):
         """
@@ -164,16 +246,20 @@ class initCtlPdcFromClient():
         sectionPrint(f"set delay of {signal} pins")
 
         # reset the delay lines
-        self.client.runPrint(f"ioDelaySet --signal {signal} --reset")  # reset all delay
+        self._run(f"ioDelaySet --signal {signal} --reset")  # reset all delay
 
-        # get number of delay lines to configure
-        numLines=self.client.runReturnSplitInt(f"ioDelaySet --signal {signal} -n")
+        # get number of delay lines to configure (does not change during a run)
+        if signal not in self._numDelayLines:
+            self.flush()
+            self._numDelayLines[signal] = self.client.runReturnSplitInt(f"ioDelaySet --signal {signal} -n")
+        numLines = self._numDelayLines[signal]
 
         for line in range(numLines):
-            self.client.runPrint(f"ioDelaySet --signal {signal} --sel {line} --count {delay} --get")
+            self._run(f"ioDelaySet --signal {signal} --sel {line} --count {delay} --get")
 
     def checkPowerGood(self):
         sectionPrint("check for power good")
+        self.flush()
         pwrGood = self.client.runReturnSplitInt('ctlCfg -P')
         if (pwrGood & self.pdcEnUser) != self.pdcEnUser:
             print(f"{fgColors.red}The proper adaptor board is not turned on, turn it on and restart the script{fgColors.endc}")
@@ -181,13 +267,18 @@ class initCtlPdcFromClient():
 
     def setCfgRtnEn(self):
         sectionPrint("enable CFG_RTN_EN")
-        nCfgRtnEn = self.client.runReturnSplitInt('rtnEn -n')
+        self.flush()
+        if self._nCfgRtnEn is None:
+            # number of lines does not change during a run
+            self._nCfgRtnEn = self.client.runReturnSplitInt('rtnEn -n')
+        nCfgRtnEn = self._nCfgRtnEn
         if self.nPdcMax == 8:
             # 2x2 heads setup
             if nCfgRtnEn != self.nPdcMax:
                 print(f"{fgColors.red}ERROR: number of CFG_RTN_EN lines is different than expected, contact the system designer for a fix.{fgColors.endc}")
                 sys.exit()
-            self.client.runPrint(f"rtnEn -e 0x{self.pdcEnUser:04x} -s")
+            self._run(f"rtnEn -e 0x{self.pdcEnUser:04x} -s")
+            self.flush()
             cfgRtnEnSet = self.client.runReturnSplitInt(f"rtnEn -s", printCmd=False)
             if self.pdcEnUser != cfgRtnEnSet:
                 # setting is not as expected
@@ -198,8 +289,8 @@ class initCtlPdcFromClient():
             # 8x8 head setup
             PG = self.client.runReturnSplitInt(f"rtnEn -s", printCmd=False)
             PG_EXP = 0
-            if self.pdcEnUser&0xFFFF != 0: PG_EXP+=1
-            if (self.pdcEnUser>16)&0xFFFF != 0: PG_EXP+=2
+            if self._pdcEnLow != 0: PG_EXP+=1
+            if self._pdcEnHigh != 0: PG_EXP+=2
             if PG&PG_EXP != PG_EXP:
                 # setting is not as expected
                 print(f"{fgColors.red}The proper adaptor board is not turned on, turn it on and restart the script{fgColors.endc}")
@@ -207,22 +298,22 @@ class initCtlPdcFromClient():
 
     def preparePDC(self):
         sectionPrint("setup the PDCs to use")
-        self.client.runPrint(f"ctlCfg -a PDC0 -r 0x{self.pdcEnUser&0xFFFF:04x} -g")        # enable PDC
-        self.client.runPrint(f"ctlCfg -a PDC1 -r 0x{(self.pdcEnUser>>16)&0xFFFF:04x} -g")  # enable PDC
-        self.client.runPrint(f"ctlCfg -a CFG0 -r 0x{self.pdcEnUser&0xFFFF:04x} -g")        # enable PDC configuration
-        self.client.runPrint(f"ctlCfg -a CFG1 -r 0x{(self.pdcEnUser>>16)&0xFFFF:04x} -g")  # enable PDC configuration
-        self.client.runPrint( "ctlCfg -a PRST -r 0x0000   -g")                             # reset all PDCs
+        self._run(f"ctlCfg -a PDC0 -r 0x{self._pdcEnLow:04x} -g")   # enable PDC
+        self._run(f"ctlCfg -a PDC1 -r 0x{self._pdcEnHigh:04x} -g")  # enable PDC
+        self._run(f"ctlCfg -a CFG0 -r 0x{self._pdcEnLow:04x} -g")   # enable PDC configuration
+        self._run(f"ctlCfg -a CFG1 -r 0x{self._pdcEnHigh:04x} -g")  # enable PDC configuration
+        self._run( "ctlCfg -a PRST -r 0x0000   -g")                 # reset all PDCs
 
         # remove reset from PDCs
         if self.nPdcMax == 8:
             # 2x2 head setup, 1 reset per PDC
-            self.client.runPrint(f"ctlCfg -a PRST -r 0x{self.pdcEnUser:04x} -g")
+            self._run(f"ctlCfg -a PRST -r 0x{self.pdcEnUser:04x} -g")
         elif self.nPdcMax == 32:
             # 8x8 head setup, # reset for all
-            self.client.runPrint(f"ctlCfg -a PRST -r 0x1 -g")
+            self._run(f"ctlCfg -a PRST -r 0x1 -g")
 
     def setCtlMode(self, mode:Literal["MODE_CFG", "MODE_ACQ", "MODE_TRG"]):
-        self.client.runPrint(f"ctlCmd -c {mode}")
+        self._run(f"ctlCmd -c {mode}")
 
     def setupFSM(self, cfg_dict:dict):
         """
@@ -230,39 +321,27 @@ class initCtlPdcFromClient():
 
         cfg_dict: dict containing the register and value to configure for the FSM. Only certain registers are allowed
         """
-        allowed_keys = ["TOUT",
-                        "FEND",
-                        "FTX1",
-                        "FTX0",
-                        "ATX1",
-                        "ATX0",
-                        "SLW1",
-                        "SLW0",
-                        "FST1",
-                        "FST0",
-                        "FACQ",
-                        "FSMM",
-                        "MISC"]
-        
-        cmd = ""
+        cmds = []
         for reg, value in cfg_dict.items():
-            if reg not in allowed_keys:
+            template = FSM_CMD_TEMPLATES.get(reg)
+            if template is None:
                 print(f"{fgColors.bYellow} Cannot configure register {reg} for FSM {fgColors.endc}")
                 continue
-            cmd += f"ctlCfg -a {reg} -r 0x{value:04x} -g ; "
-        self.client.runPrint(cmd)
+            cmds.append(template.format(value))
+        if cmds:
+            self._run(" ; ".join(cmds))
 
     def startFSM(self):
-        self.client.runPrint("ctlCmd -c FSM_START")
+        self._run("ctlCmd -c FSM_START")
 
     def trigger(self):
-        self.client.runPrint("ctlCmd -c PDC_TRG")
+        self._run("ctlCmd -c PDC_TRG")
 
     def pack_trg_bank(self, bank:Literal["A", "B"]):
         if bank not in ["A", "B"]:
             print(f"{fgColors.bYellow} Unknown bank {bank} supplied {fgColors.endc}")
             return False
-        self.client.runPrint(f"ctlCmd -c PACK_TRG_{bank}")
+        self._run(f"ctlCmd -c PACK_TRG_{bank}")
 
     def validPdcCfg(self):
         # list of status to validate
@@ -276,7 +355,7 @@ class initCtlPdcFromClient():
         #    "PDC_CFG_VALID_LEN_ERR",
         #    "GENERAL_STATUS",
         #]
-        statusToValidate = [
+        statusToValidate = (
             "BNK_RTN_CLK_ERR",
             "BNK_RTN_DATA_ERR",
             "PDC_CMD_VALID_ERR",
@@ -284,12 +363,13 @@ class initCtlPdcFromClient():
             "PDC_CFG_CS_ERR",
             "PDC_CFG_VALID_LEN_ERR",
             "GENERAL_STATUS",
-        ]
+        )
         # original check is CFG_VALID_ERR and CFG_CS_ERR
         # ctlCfg option --status (-s) can take multiple status, separated by a comma
         statusStr = ",".join(statusToValidate)
         cmd = f"ctlCfg -s {statusStr}"
         # running the command
+        self.flush()
         hostOutput = self.client.runReturn(cmd)
         hostOutput.encoding = 'utf-8'
 
@@ -303,51 +383,57 @@ class initCtlPdcFromClient():
         if errorDetected:
             sys.exit()
 
-        # get status, looping through all stdout lines
-        nStatusFound = 0
+        # get status in a single pass through all stdout lines
+        # each status line is formatted as 'STATUS_NAME: 0xVALUE'
+        statusReceived = {}
         for statusLine in hostOutput.stdout:
-            # check for all status
-            for status in statusToValidate:
-                if statusLine.startswith(status):
-                    # statusLine contains the required status to validate
-                    nStatusFound += 1
-                    statusReceived = int(statusLine.split(':')[-1], base=16)
-                    print(f"statusReceived for '{status}' is '{statusReceived}'")
-                    if statusReceived != 0:
-                        print(f"{fgColors.red}ERROR: {status} is set to 0x{statusReceived:08x}, expecting '0x00000000'.{fgColors.endc}")
-                        sys.exit()
-                    break
-        if nStatusFound != len(statusToValidate):
+            status, sep, value = statusLine.partition(':')
+            status = status.strip()
+            if sep and status in statusToValidate:
+                statusReceived[status] = int(value, base=16)
+                print(f"statusReceived for '{status}' is '{statusReceived[status]}'")
+
+        # report all errors at once
+        errorMsg = []
+        for status, value in statusReceived.items():
+            if value != 0:
+                errorMsg.append(f"ERROR: {status} is set to 0x{value:08x}, expecting '0x00000000'.")
+        if len(statusReceived) != len(statusToValidate):
             # not all status found
-            print(f"{fgColors.red}ERROR: expected to find {len(statusToValidate)} status registers, but only found {nStatusFound}.{fgColors.endc}")
+            errorMsg.append(f"ERROR: expected to find {len(statusToValidate)} status registers, but only found {len(statusReceived)}.")
+        if errorMsg:
+            for msg in errorMsg:
+                print(f"{fgColors.red}{msg}{fgColors.endc}")
             sys.exit()
 
     def initExample(self):
         """
         default example
+        all write commands are sent in as few ssh commands as possible
         """
-        self.setSysClkPrd()
-        self.print()
-        self.resetCtl()
-        self.setCtlPacket(bank=packetBank.BANKA, SCS=0x0000, SCD=0x0000, SPD=0x0000)
-        self.setDelay(signal="CFG_DATA", delay=300)
-        self.setCfgRtnEn()
-        fsm_config = {
-            "TOUT": 0x5030,
-            "FEND": 0x8200,
-            "FTX1": 0x0080,
-            "FTX0": 0x8600,
-            "ATX1": 0x0000,
-            "ATX0": 0x0000,
-            "SLW1": 0x0000,
-            "SLW0": 0x0000,
-            "FST1": 0x0080,
-            "FST0": 0x8600,
-            "FACQ": 0x0007,
-            "FSMM": 0x0111 
-        }
-        self.setupFSM(fsm_config)
-        self.preparePDC()
+        with self.batch():
+            self.setSysClkPrd()
+            self.print()
+            self.resetCtl()
+            self.setCtlPacket(bank=packetBank.BANKA, SCS=0x0000, SCD=0x0000, SPD=0x0000)
+            self.setDelay(signal="CFG_DATA", delay=300)
+            self.setCfgRtnEn()
+            fsm_config = {
+                "TOUT": 0x5030,
+                "FEND": 0x8200,
+                "FTX1": 0x0080,
+                "FTX0": 0x8600,
+                "ATX1": 0x0000,
+                "ATX0": 0x0000,
+                "SLW1": 0x0000,
+                "SLW0": 0x0000,
+                "FST1": 0x0080,
+                "FST0": 0x8600,
+                "FACQ": 0x0007,
+                "FSMM": 0x0111 
+            }
+            self.setupFSM(fsm_config)
+            self.preparePDC()
 
 if __name__ == "__main__":
     # -----------------------------------------------
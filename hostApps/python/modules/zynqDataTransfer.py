@@ -12,8 +12,13 @@
 #-- Additional Comments:
 #----------------------------------------------------------------------------------
 import sys, os
+import time
+import signal
 import ipaddress
+import socket
 import subprocess
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 # custom modules
 from modules.fgColors import fgColors
@@ -31,8 +36,9 @@ class zynqDataTransfer:
 
         # address of the host running this code
         self.hostAddr = "127.0.0.1"
-        with os.popen("hostname -I") as hostCmd:
-            self.hostAddr = hostCmd.read().strip()
+        hostCmd = subprocess.run(["hostname", "-I"], capture_output=True, text=True)
+        if hostCmd.returncode == 0:
+            self.hostAddr = hostCmd.stdout.strip()
 
         # path to NFS bin and data on Zynq board
         self.zynqNfsBinPath = "/mnt/bin"
@@ -41,6 +47,7 @@ class zynqDataTransfer:
         self.nfsServerName = None
         self.nfsServerAddr = None
         self.launchedFromNfsServer = False
+        self._dfTable = None  # output of 'df -T' on Zynq, read once
 
         # dataReader app
         self.dataReaderName = "dataReader"
@@ -59,27 +66,31 @@ class zynqDataTransfer:
         # HDF5
         self.h5Path = None
 
+        # recent pgrep results, app name -> (time.monotonic(), PID list)
+        self._pidCache = {}
+        self._pidCacheTtl = 0.5  # seconds
+
 
     def __del__(self):
         """
         destructor, cleaning everything, closing app when done
         """
         # destructor
-        if self.dataReaderPidLocal != None:
-            # close dataReader if open within this app
-            for PID in self.dataReaderPidLocal:
-                print(f"closing {self.dataReaderName} at PID {PID}")
-                self.sshClient.run(f"kill {PID}")
-        if self.hexAppPidLocal != None:
+        if self.dataReaderPidLocal:
+            # close dataReader if open within this app, all PIDs in a single command
+            print(f"closing {self.dataReaderName} at PID {' '.join(self.dataReaderPidLocal)}")
+            self.sshClient.run(f"kill {' '.join(self.dataReaderPidLocal)}")
+            self.dataReaderPidLocal = None
+        if self.hexAppPidLocal:
             # close hexApp if open within this app
             for PID in self.hexAppPidLocal:
                 print(f"closing {self.hexAppName} at PID {PID}")
-                #os.popen(f"kill {PID}")
-                # to kill only if process is still active
                 try:
-                    os.popen(f"pgrep {self.hexAppName} | grep {self.hexAppPidLocal} | xargs -I {{}} kill {{}}")
-                except ImportError as e: # Python was shutting when this was called
+                    os.kill(int(PID), signal.SIGTERM)
+                except (ProcessLookupError, ValueError):
+                    # process already closed or invalid PID
                     pass
+            self.hexAppPidLocal = None
 
 
     def debug(self):
@@ -94,9 +105,10 @@ class zynqDataTransfer:
         try to find the path to hexApp, if not use a default value
         """
         # test if hexApp is in path
-        with os.popen(f"which {self.hexAppName}") as hostCmd:
-            hexAppPath = hostCmd.read().strip()
-        if len(hexAppPath) > 0:
+        hexAppPath = shutil.which(self.hexAppName)
+        if hexAppPath is not None:
+            # keep only the directory, the name is in self.hexAppName
+            hexAppPath = os.path.dirname(hexAppPath)
             if os.path.isfile(os.path.join(hexAppPath, self.hexAppName)):
                 self.hexAppPath = hexAppPath
                 print(f"{fgColors.green}'{self.hexAppName}' found at '{self.hexAppPath}'.{fgColors.endc}")
@@ -122,8 +134,10 @@ class zynqDataTransfer:
         get Zynq board NFS settings and store them
         """
         # NFS settings - from Zynq linux file system command 'df'
-        nfsSettings = self.sshClient.runReturnStr(f"df -T | grep {self.zynqNfsDataPath}",
-                                                  printCmd=False)
+        # filtered locally, no remote shell pipe required
+        if self._dfTable is None:
+            self._dfTable = self.sshClient.runReturnStr("df -T", printCmd=False)
+        nfsSettings = [line for line in self._dfTable if self.zynqNfsDataPath in line]
         if len(nfsSettings) == 0:
             # NFS data path is not mounted
             print(f"{fgColors.red}ERROR: The NFS is not properly configured on the ZCU102.\n"
@@ -146,13 +160,11 @@ class zynqDataTransfer:
                 # check if nfsServerName is set as an IPv4 address
                 self.nfsServerAddr = str(ipaddress.ip_address(self.nfsServerName))
             except ValueError as ex:
-                # not a valid IPv4 address, maybe a hostname, try to ping it
-                nfsServerIp = self.nfsServerName # default value if ping is not working
-                pingStr = self.sshClient.runReturnStr(f"ping {self.nfsServerName} -c 1 -W 0.1 2>&1", printCmd=False)
-                for line in pingStr:
-                    if line.startswith(f"PING {self.nfsServerName} ("):
-                        nfsServerIp = line.replace(f"PING {self.nfsServerName} (", "").split(")")[0]
-                        break
+                # not a valid IPv4 address, maybe a hostname, resolve it locally
+                try:
+                    nfsServerIp = socket.getaddrinfo(self.nfsServerName, None, family=socket.AF_INET)[0][4][0]
+                except socket.gaierror:
+                    nfsServerIp = self.nfsServerName # default value if name cannot be resolved
                 try:
                     # last try, if it fails, leave it as is and let the rest of the script handle it
                     self.nfsServerAddr = str(ipaddress.ip_address(nfsServerIp))
@@ -184,7 +196,29 @@ class zynqDataTransfer:
         """
         private function to get process id of dataReader app
         """
-        return self.sshClient.runReturnStr(f"pgrep {self.dataReaderName}", printCmd=False)
+        PID = self.__getCachedPid(self.dataReaderName)
+        if PID is None:
+            PID = self.sshClient.runReturnStr(f"pgrep {self.dataReaderName}", printCmd=False)
+            self.__setCachedPid(self.dataReaderName, PID)
+        return PID
+
+    def __getCachedPid(self, name):
+        """
+        private function to get a recent PID list of an app, None if too old or missing
+        """
+        cached = self._pidCache.get(name)
+        if cached is not None and (time.monotonic() - cached[0]) < self._pidCacheTtl:
+            return list(cached[1])
+        return None
+
+    def __setCachedPid(self, name, PID):
+        """
+        private function to save the PID list of an app, None to invalidate
+        """
+        if PID is None:
+            self._pidCache.pop(name, None)
+        else:
+            self._pidCache[name] = (time.monotonic(), list(PID))
 
 
     def initDataReader(self, dataReaderLaunch=False):
@@ -199,6 +233,7 @@ class zynqDataTransfer:
                 # starting the app if not running
                 print(f"{fgColors.bBlue}INFO: starting '{self.dataReaderName}'.{fgColors.endc}")
                 self.sshClient.run(f"{self.dataReaderName} -vvv -c")
+                self.__setCachedPid(self.dataReaderName, None)
                 PID = self.__getDataReaderPid()
                 self.dataReaderPidLocal = PID  # started by this application
                 return
@@ -238,13 +273,39 @@ class zynqDataTransfer:
         """
         private function to get process id of hdf5 app
         """
-        with os.popen(f"pgrep {self.hexAppName}") as hostCmd:
-            return hostCmd.read().split()
-        return []
+        PID = self.__getCachedPid(self.hexAppName)
+        if PID is None:
+            hostCmd = subprocess.run(["pgrep", self.hexAppName], capture_output=True, text=True)
+            PID = hostCmd.stdout.split()
+            self.__setCachedPid(self.hexAppName, PID)
+        return PID
 
 
+    def __getHexAppOutPath(self, pid):
+        """
+        private function to get the '-o' output path of a running hdf5 app
+        return None if the process is gone or has no '-o' argument
+        """
+        try:
+            # arguments in /proc/PID/cmdline are separated by null characters
+            with open(f"/proc/{pid}/cmdline", "rb") as cmdFile:
+                hexAppArgs = cmdFile.read().split(b"\x00")
+            return hexAppArgs[hexAppArgs.index(b"-o")+1].decode()
+        except (OSError, ValueError, IndexError):
+            return None
+
     def initHex(self, autoStart=False, printParsed=False, archive=False):
         # hdf5 app
+        if not self.__startHex(autoStart=autoStart, printParsed=printParsed, archive=archive):
+            sys.exit()
+        self.__askH5Path()
+
+    def __startHex(self, autoStart=False, printParsed=False, archive=False):
+        """
+        find or start the hdf5 app and its output path, without user interaction
+        (can run in a worker thread, see init)
+        return False if the app is not running and can not be started
+        """
         PID = self.__getHexAppPid()
         
         if len(PID) == 0:
@@ -255,63 +316,66 @@ class zynqDataTransfer:
                     # try to fing path to app
                     self.__getHexAppPath()
                     print(f"{fgColors.bBlue}INFO: starting '{self.hexAppName}' to read from '{self.serverNfsDataPath}'.{fgColors.endc}")
-                    archiveOption = ""
+                    # argument list, no shell involved so the PID is the one of the app
+                    hexAppArgv = [os.path.join(self.hexAppPath, self.hexAppName)]
                     if archive:
-                        archiveOption = "-a"
-                    hexReadOptions = ""
+                        hexAppArgv.append("-a")
                     if self.hexAppName == "hexRead":
                         # hexRead do not export as HDF5 per default
-                        hexReadOptions += " --h5"
+                        hexAppArgv.append("--h5")
                         if printParsed:
                             # debug option to print parsed data (slower execution)
-                            hexReadOptions += " --print"
-                        hexReadOptions += " --verbose 2"
-
-                    cmd = f"{os.path.join(self.hexAppPath, self.hexAppName)} " \
-                          f"{archiveOption} {hexReadOptions} " \
-                          f"-i {self.serverNfsDataPath} " \
-                          f"-o {self.hexAppOutPathDefault}"
-                    print(f"{fgColors.bBlue}INFO: {cmd}{fgColors.endc}")
-                    self.hexAppPopen = subprocess.Popen(cmd, shell=True,
-                                                        stdout=subprocess.DEVNULL,
-                                                        stderr=subprocess.DEVNULL,
-                                                        encoding='utf-8')
+                            hexAppArgv.append("--print")
+                        hexAppArgv += ["--verbose", "2"]
+                    hexAppArgv += ["-i", self.serverNfsDataPath,
+                                   "-o", self.hexAppOutPathDefault]
+                    print(f"{fgColors.bBlue}INFO: {' '.join(hexAppArgv)}{fgColors.endc}")
                     try:
-                        # if an error occurs while starting the app, it is quick, otherwise, it will timeout
-                        self.hexAppPopen.communicate(timeout=0.01)
-                        if self.hexAppPopen.returncode:
-                            print(f"{fgColors.red}ERROR: {self.hexAppName} app returned exit code {self.hexAppPopen.returncode}.{fgColors.endc}")
-                    except subprocess.TimeoutExpired:
-                        # normal execution
-                        pass
-
-                    PID = self.__getHexAppPid()
+                        self.hexAppPopen = subprocess.Popen(hexAppArgv,
+                                                            stdout=subprocess.DEVNULL,
+                                                            stderr=subprocess.DEVNULL,
+                                                            encoding='utf-8')
+                    except (FileNotFoundError, PermissionError) as ex:
+                        print(f"{fgColors.red}ERROR: could not start '{hexAppArgv[0]}'.{fgColors.endc}")
+                        printException(ex)
+                        self.hexAppPopen = None
+
+                    PID = []
+                    if self.hexAppPopen is not None:
+                        try:
+                            # if an error occurs while starting the app, it is quick, otherwise, it will timeout
+                            self.hexAppPopen.communicate(timeout=0.01)
+                            if self.hexAppPopen.returncode:
+                                print(f"{fgColors.red}ERROR: {self.hexAppName} app returned exit code {self.hexAppPopen.returncode}.{fgColors.endc}")
+                        except subprocess.TimeoutExpired:
+                            # normal execution, app is still running
+                            PID = [str(self.hexAppPopen.pid)]
+                    self.__setCachedPid(self.hexAppName, PID)
                     self.hexAppPidLocal = PID  # started by this application
 
                 else:
                     # running on NFS server and app is not started
                     print(f"{fgColors.red}ERROR: '{self.hexAppName}' app is not running on the server.{fgColors.endc}")
-                    sys.exit()
+                    return False
             else:
                 # not running on the NFS server
                 print(f"{fgColors.bYellow}WARNING: '{self.hexAppName}' app is not running on this machine.{fgColors.endc}")
 
         if len(PID) == 1:
             # a single PID found
-            with os.popen(f"cat /proc/{PID[0]}/cmdline | sed -e 's|\\x00| |g'; echo") as hostCmd:
-                hexAppArgs = hostCmd.read().split()
-            try:
-                outIdx = hexAppArgs.index('-o')+1
-                h5Path = hexAppArgs[outIdx]
-                if os.path.isdir(h5Path):
-                    self.h5Path = h5Path
-                    self.hexAppPidRemote = PID
-                    print(f"{fgColors.bBlue}INFO: '{self.hexAppName}' is running.{fgColors.endc}")
-                    print(f"{fgColors.bBlue}INFO: using {self.h5Path} as path to look for HDF5 data.{fgColors.endc}")
-            except IndexError:
-                pass
-
-        #sys.exit()
+            h5Path = self.__getHexAppOutPath(PID[0])
+            if h5Path is not None and os.path.isdir(h5Path):
+                self.h5Path = h5Path
+                self.hexAppPidRemote = PID
+                print(f"{fgColors.bBlue}INFO: '{self.hexAppName}' is running.{fgColors.endc}")
+                print(f"{fgColors.bBlue}INFO: using {self.h5Path} as path to look for HDF5 data.{fgColors.endc}")
+        return True
+
+    def __askH5Path(self):
+        """
+        ask the user for the HDF5 path when it was not found, exit if it does not exist
+        (interactive, from the main thread only)
+        """
         if self.h5Path == None:
             h5Path = input(f"Could not find the HDF5 export path. Enter the path to use:")
             if os.path.isdir(h5Path):
@@ -323,8 +387,16 @@ class zynqDataTransfer:
     def init(self, archive=False):
         try:
             self.initNfs()
-            self.initDataReader(dataReaderLaunch=True)
-            self.initHex(autoStart=True, archive=archive)
+            # hexRead is local to the host and independent from dataReader,
+            # start it in a worker while the ssh client (not thread safe) is used from here
+            # NOTE: only the start is done in the worker, the prompt and exit stay in the main thread
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                hexFuture = executor.submit(self.__startHex, autoStart=True, archive=archive)
+                self.initDataReader(dataReaderLaunch=True)
+                hexStarted = hexFuture.result()
+            if not hexStarted:
+                sys.exit()
+            self.__askH5Path()
             self.debug()
         except KeyboardInterrupt:
             print("\nKeyboard Interrupt: exit program")
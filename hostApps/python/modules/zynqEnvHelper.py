@@ -12,6 +12,7 @@
 #-- Additional Comments:
 #----------------------------------------------------------------------------------
 import os, sys
+import stat
 from enum import IntEnum
 
 # custom modules
@@ -20,112 +21,156 @@ import modules.systemHelper as systemHelper
 import modules.sshClientHelper as sshClientHelper
 #from modules.zynqHelper import *
 
-try:
-    moduleName = os.path.basename(__file__)
-except NameError:
-    moduleName = "moduleNameNotFound.py"
-
-systemHelper.sectionPrint("Setting project path variables")
-
-# -----------------------------------------------
-# --- get PROJECT_PATH based on setup
-# -----------------------------------------------
-# NOTE: possible options:
-#       1- from PROJECT_PATH environment variable
-#       3- from the hardcoded path (not recommended)
-if os.environ.get("PROJECT_PATH") is not None:
-    # user specified the PROJECT_PATH from shell
-    PROJECT_PATH = os.environ['PROJECT_PATH']
-    print(f"{fgColors.green}[{moduleName}] Using project path defined by os.environ['PROJECT_PATH']: {PROJECT_PATH}{fgColors.endc}")
-
-else:
-    try:
-        modulesPath = os.path.dirname(os.path.abspath(__file__))
-        pythonPath = os.path.dirname(modulesPath)
-    except NameError:
-        modulesPath = os.path.abspath("./")
-        pythonPath = os.path.dirname(modulesPath)
-    if "hostApps" in pythonPath:
-        projectPath = pythonPath.split("hostApps")[0]
-        if projectPath[-1] == "/":
-            projectPath = projectPath[:-1]
-        if os.path.isdir(projectPath):
-            PROJECT_PATH = projectPath
-            print(f"{fgColors.green}[{moduleName}] Using project path from current path: {PROJECT_PATH}{fgColors.endc}")
-
-if not "PROJECT_PATH" in locals():
-    # fall back, should not end here
-    PROJECT_PATH = os.path.abspath("../../")
-    print(f"{fgColors.yellow}[{moduleName}] Using relative path from current path: {PROJECT_PATH}{fgColors.endc}")
-
-
-# -----------------------------------------------
-# --- get HOST_APPS_PATH based on setup
-# -----------------------------------------------
-if os.path.isfile("/etc/debian_version"):
-    HOST_APPS_PATH = f"{PROJECT_PATH}/hostApps/cpp/debianBasedOS"
-elif os.path.isfile("/etc/redhat-release"):
-    HOST_APPS_PATH = f"{PROJECT_PATH}/hostApps/cpp/debianBasedOS"
-else:
-    print(f"{fgColors.red}[{moduleName}] ERROR: Unsupported OS. Please ask for support with your OS info.{fgColors.endc}")
-    sys.exit()
-
+moduleName = os.path.basename(globals().get("__file__", "moduleNameNotFound.py"))
 
-# -----------------------------------------------
-# --- get USER_DATA_DIR path based on setup
-# -----------------------------------------------
-HOME = os.environ.get("HOME", "~") # home of user
-defaultUserDataDir = os.path.join(HOME, "PDCv2-data")
-if os.environ.get("USER_DATA_DIR") is not None:
-    # user specified the USER_DATA_DIR from shell
-    USER_DATA_DIR = os.environ['USER_DATA_DIR']
-    print(f"{fgColors.green}[{moduleName}] Using user data directory defined by os.environ['USER_DATA_DIR']: {USER_DATA_DIR}{fgColors.endc}")
-
-elif os.path.isdir(defaultUserDataDir):
-    # user created default directory (normally created in setup.sh)
-    USER_DATA_DIR = defaultUserDataDir
-    print(f"{fgColors.green}[{moduleName}] Using default user data directory: {USER_DATA_DIR}{fgColors.endc}")
-
-else:
-    # user want to hard code its data directory
-    print(f"{fgColors.yellow}[{moduleName}] To use a custom user data directory, set environment variable 'USER_DATA_DIR' from your shell,{fgColors.endc}")
-    print(f"{fgColors.yellow}[{moduleName}] or create the default directory at {defaultUserDataDir}{fgColors.endc}.")
-    USER_DATA_DIR = "/mnt/zynq/PDCv2/user-data"
-    print(f"{fgColors.green}[{moduleName}] Using manually defined user data directory: {USER_DATA_DIR}{fgColors.endc}")
-
-# -----------------------------------------------
-# --- get HDF5 input path based on setup
-# -----------------------------------------------
-# HDF5 directory to read from
-# NOTE: possible options:
-#       1- from HDF5_DATA_DIR environment variable
-#       2- from default directory (defaultHdf5Dir)
-#       3- from the hardcoded path (not recommended)
-
-defaultHdf5Dir = os.path.join(defaultUserDataDir, "HDF5")
-if os.environ.get("HDF5_DATA_DIR") is not None:
-    # user specified the HDF5_DATA_DIR from shell
-    HDF5_DATA_DIR = os.environ['HDF5_DATA_DIR']
-    print(f"{fgColors.green}[{moduleName}] Using HDF5 input directory defined by os.environ['HDF5_DATA_DIR']: {HDF5_DATA_DIR}{fgColors.endc}")
-
-elif os.path.isdir(defaultHdf5Dir):
-    # user created default hdf5 directory (normally created in setup.sh)
-    HDF5_DATA_DIR = defaultHdf5Dir
-    print(f"{fgColors.green}[{moduleName}] Using default HDF5 input directory: {HDF5_DATA_DIR}{fgColors.endc}")
+# informational messages only with PDC_VERBOSE=1, warnings and errors are always printed
+_V = systemHelper.VERBOSE
 
+# message prefixes built once, without colors when the output is redirected
+if sys.stdout.isatty():
+    _G = f"{fgColors.green}[{moduleName}] "
+    _Y = f"{fgColors.yellow}[{moduleName}] "
+    _R = f"{fgColors.red}[{moduleName}] "
+    _E = fgColors.endc
 else:
-    # user want to hard code its HDF5 directory
-    print(f"{fgColors.yellow}[{moduleName}] To use a custom directory for HDF5, set environment variable 'HDF5_DATA_DIR' from your shell,{fgColors.endc}")
-    print(f"{fgColors.yellow}[{moduleName}] or create the default directory at {defaultHdf5Dir}{fgColors.endc}.")
-    HDF5_DATA_DIR = "/mnt/zynq/PDCv2/user-data/HDF5"
-    print(f"{fgColors.green}[{moduleName}] Using manually defined HDF5 input directory: {HDF5_DATA_DIR}{fgColors.endc}")
-
-
-
-
-
-
-
-
+    _G = _Y = _R = f"[{moduleName}] "
+    _E = ""
+
+if _V: systemHelper.sectionPrint("Setting project path variables")
+
+def _osRelease():
+    """
+    find the OS release file with a single stat per candidate
+    return the release file, or None
+    """
+    for osFile in ("/etc/debian_version", "/etc/redhat-release"):
+        try:
+            st = os.stat(osFile)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            return osFile
+    return None
+
+# host apps directory for each supported OS family
+_HOST_APPS_OS_DIR = {
+    "debian": "debianBasedOS",
+    "redhat": "redHatBasedOS",
+}
+_OS_RELEASE_FAMILY = {
+    "/etc/debian_version": "debian",
+    "/etc/redhat-release": "redhat",
+}
+
+def _resolvePaths(osFamily):
+    """
+    resolve the project and data paths from the environment and file system
+    """
+    # -----------------------------------------------
+    # --- get PROJECT_PATH based on setup
+    # -----------------------------------------------
+    # NOTE: possible options:
+    #       1- from PROJECT_PATH environment variable
+    #       3- from the hardcoded path (not recommended)
+    if os.environ.get("PROJECT_PATH") is not None:
+        # user specified the PROJECT_PATH from shell
+        PROJECT_PATH = os.environ['PROJECT_PATH']
+        if _V: print(f"{_G}Using project path defined by os.environ['PROJECT_PATH']: {PROJECT_PATH}{_E}")
+
+    else:
+        try:
+            modulesPath = os.path.dirname(os.path.abspath(__file__))
+            pythonPath = os.path.dirname(modulesPath)
+        except NameError:
+            modulesPath = os.path.abspath("./")
+            pythonPath = os.path.dirname(modulesPath)
+        if "hostApps" in pythonPath:
+            projectPath = pythonPath.split("hostApps")[0]
+            if projectPath[-1] == "/":
+                projectPath = projectPath[:-1]
+            if os.path.isdir(projectPath):
+                PROJECT_PATH = projectPath
+                if _V: print(f"{_G}Using project path from current path: {PROJECT_PATH}{_E}")
+
+    if not "PROJECT_PATH" in locals():
+        # fall back, should not end here
+        PROJECT_PATH = os.path.abspath("../../")
+        print(f"{_Y}Using relative path from current path: {PROJECT_PATH}{_E}")
+
+
+    # -----------------------------------------------
+    # --- get HOST_APPS_PATH based on setup
+    # -----------------------------------------------
+    if osFamily in _HOST_APPS_OS_DIR:
+        HOST_APPS_PATH = f"{PROJECT_PATH}/hostApps/cpp/{_HOST_APPS_OS_DIR[osFamily]}"
+    else:
+        print(f"{_R}ERROR: Unsupported OS. Please ask for support with your OS info.{_E}")
+        sys.exit()
+
+
+    # -----------------------------------------------
+    # --- get USER_DATA_DIR path based on setup
+    # -----------------------------------------------
+    HOME = os.environ.get("HOME", "~") # home of user
+    defaultUserDataDir = os.path.join(HOME, "PDCv2-data")
+    if os.environ.get("USER_DATA_DIR") is not None:
+        # user specified the USER_DATA_DIR from shell
+        USER_DATA_DIR = os.environ['USER_DATA_DIR']
+        if _V: print(f"{_G}Using user data directory defined by os.environ['USER_DATA_DIR']: {USER_DATA_DIR}{_E}")
+
+    elif os.path.isdir(defaultUserDataDir):
+        # user created default directory (normally created in setup.sh)
+        USER_DATA_DIR = defaultUserDataDir
+        if _V: print(f"{_G}Using default user data directory: {USER_DATA_DIR}{_E}")
+
+    else:
+        # user want to hard code its data directory
+        print(f"{_Y}To use a custom user data directory, set environment variable 'USER_DATA_DIR' from your shell,{_E}")
+        print(f"{_Y}or create the default directory at {defaultUserDataDir}{_E}.")
+        USER_DATA_DIR = "/mnt/zynq/PDCv2/user-data"
+        print(f"{_G}Using manually defined user data directory: {USER_DATA_DIR}{_E}")
+
+    # -----------------------------------------------
+    # --- get HDF5 input path based on setup
+    # -----------------------------------------------
+    # HDF5 directory to read from
+    # NOTE: possible options:
+    #       1- from HDF5_DATA_DIR environment variable
+    #       2- from default directory (defaultHdf5Dir)
+    #       3- from the hardcoded path (not recommended)
+
+    defaultHdf5Dir = os.path.join(defaultUserDataDir, "HDF5")
+    if os.environ.get("HDF5_DATA_DIR") is not None:
+        # user specified the HDF5_DATA_DIR from shell
+        HDF5_DATA_DIR = os.environ['HDF5_DATA_DIR']
+        if _V: print(f"{_G}Using HDF5 input directory defined by os.environ['HDF5_DATA_DIR']: {HDF5_DATA_DIR}{_E}")
+
+    elif os.path.isdir(defaultHdf5Dir):
+        # user created default hdf5 directory (normally created in setup.sh)
+        HDF5_DATA_DIR = defaultHdf5Dir
+        if _V: print(f"{_G}Using default HDF5 input directory: {HDF5_DATA_DIR}{_E}")
+
+    else:
+        # user want to hard code its HDF5 directory
+        print(f"{_Y}To use a custom directory for HDF5, set environment variable 'HDF5_DATA_DIR' from your shell,{_E}")
+        print(f"{_Y}or create the default directory at {defaultHdf5Dir}{_E}.")
+        HDF5_DATA_DIR = "/mnt/zynq/PDCv2/user-data/HDF5"
+        print(f"{_G}Using manually defined HDF5 input directory: {HDF5_DATA_DIR}{_E}")
+
+    return {"PROJECT_PATH": PROJECT_PATH,
+            "HOST_APPS_PATH": HOST_APPS_PATH,
+            "USER_DATA_DIR": USER_DATA_DIR,
+            "HDF5_DATA_DIR": HDF5_DATA_DIR}
 
 
+try:
+    # OS family written by setupHosts/setup.sh, no need to probe the OS at each import
+    from modules._env_const import OS_FAMILY
+except ImportError:
+    OS_FAMILY = _OS_RELEASE_FAMILY.get(_osRelease())
+_paths = _resolvePaths(OS_FAMILY)
+
+PROJECT_PATH = _paths["PROJECT_PATH"]
+HOST_APPS_PATH = _paths["HOST_APPS_PATH"]
+USER_DATA_DIR = _paths["USER_DATA_DIR"]
+HDF5_DATA_DIR = _paths["HDF5_DATA_DIR"]
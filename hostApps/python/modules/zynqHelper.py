@@ -12,6 +12,7 @@
 #-- Additional Comments:
 #----------------------------------------------------------------------------------
 import os, sys
+import re
 from enum import IntEnum
 
 # custom modules
@@ -20,25 +21,46 @@ import modules.systemHelper as systemHelper
 import modules.sshClientHelper as sshClientHelper
 #from modules.zynqHelper import *
 
-try:
-    moduleName = os.path.basename(__file__)
-except NameError:
-    moduleName = "moduleNameNotFound.py"
+moduleName = os.path.basename(globals().get("__file__", "moduleNameNotFound.py"))
 
 
 # -----------------------------------------------
 # --- Convert board_info into a dict for export
 # -----------------------------------------------
-def boardInfo2Dict(client):
+# 'key : value' line of boardInfo, split at the first ':'
+_BOARD_INFO_KV = re.compile(r'\s*([^:]+?)\s*:\s*(.*?)\s*$')
+
+# parsed boardInfo per (host, boot id), boardInfo only changes with a new bitstream/boot
+_boardInfoCache = {}
+
+def _getBootId(client):
+    """
+    Boot id of the zynq, read once per client since a reboot also closes the ssh session.
+    """
+    if getattr(client, "bootId", None) is None:
+        client.bootId = client.runReturnStr('cat /proc/sys/kernel/random/boot_id', printCmd=False)[0].strip()
+    return client.bootId
+
+def boardInfo2Dict(client, refresh=False):
     """
     Running boardInfo app on zynq, list all parameters
     and returning them as a python dictionary.
+    The result is cached for the current boot of the zynq, use refresh=True to read it again.
     """
-    biStr = client.runReturnStr('boardInfo -l', printCmd=False)
-    biDict=dict((key.strip(), value.strip())
-        for key, value in (line.split(':')
-        for line in biStr))
-    return biDict
+    cacheKey = (client.client.host, _getBootId(client))
+    if refresh or cacheKey not in _boardInfoCache:
+        biStr = client.runReturnStr('boardInfo -l', printCmd=False)
+        # key and value are extracted without the surrounding spaces by the regex groups,
+        # values can contain ':' and lines without ':' are skipped
+        biDict = dict(match.groups() for match in map(_BOARD_INFO_KV.match, biStr) if match)
+        _boardInfoCache[cacheKey] = biDict
+    return dict(_boardInfoCache[cacheKey])
+
+def boardInfo2DictCacheClear():
+    """
+    Forget all cached boardInfo, to call after changing the board state (e.g. new bitstream).
+    """
+    _boardInfoCache.clear()
 
 # -----------------------------------------------
 # --- Specifications on hardware used
@@ -59,20 +81,15 @@ class hardware_info:
 if __name__ == "__main__":
     # testing h5helper class only when module is not called via 'import'
     try:
-        # open a client
-        client = sshClientHelper.sshClient(host="zcudev")
-
-        # test boardInfo2Dict
-        BI = boardInfo2Dict(client)
+        # open a client, closed at the end of the 'with' block
+        with sshClientHelper.sshClientFromCfg(hostCfgName="zcudev") as client:
+            # test boardInfo2Dict
+            BI = boardInfo2Dict(client)
 
     except BaseException as ex:
         ## Get current system exception
         systemHelper.printException(ex)
 
-    finally:
-        # executed no matter what
-        del client
-
 
 
 
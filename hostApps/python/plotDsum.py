@@ -36,6 +36,7 @@
 import os, sys
 from pathlib import Path
 import time, datetime
+import threading, queue
 import pandas as pd
 import h5py
 import numpy as np
@@ -122,6 +123,24 @@ else:
     DSUM_SAMPLE_NCLK=1
 
 
+# -----------------------------------------------
+# --- User settings - PLOT_FAST
+# -----------------------------------------------
+# NOTE: PLOT_FAST=1 trades the look of the lines for rendering speed
+#       (no antialiasing, stronger path simplification, Agg paths drawn by chunks),
+#       useful when DSUM is acquired with many samples at high rate.
+if os.environ.get("PLOT_FAST") is not None:
+    # using environment variable
+    PLOT_FAST = os.environ['PLOT_FAST'] == "1"
+else:
+    # default setting
+    PLOT_FAST = False
+
+if PLOT_FAST:
+    plt.rcParams['path.simplify_threshold'] = 1.0
+    plt.rcParams['agg.path.chunksize'] = 10000
+
+
 # -----------------------------------------------
 # --- User settings - HDF5_DATA_DIR
 # -----------------------------------------------
@@ -146,26 +165,50 @@ DEFAULT_LOGY = False
 # number of supported PDCs
 N_PDC_MAX = 8
 
+# maximum number of HDF5 files added to the plots before each redraw
+BATCH_MAX = 16
+
+# maximum time between two scans of HDF5_DATA_DIR when the directory is unchanged (s)
+RESCAN_PRD = 0.5
+
 # database of the data
 dp = None
 
-# menu to save as data
-root = Tk()
-root.withdraw()  # Removes TK root window
-# Prompt window to front
-root.overrideredirect(True)
-root.geometry('0x0+0+0')
-root.lift()
-root.focus_set()
-root.focus_force()
-root.attributes("-topmost", True)
+# menu to save as data, created on first save (see getSaveRoot)
+saveRoot = None
 
 # path to icons for custom buttons
 iconPath = os.path.join(scriptAbsPath, 'icons')
 
+# -----------------------------------------------
+# --- Functions
+# -----------------------------------------------
+def minMaxIndices(y, nBins):
+    """
+    indices of the min and max of y in each of nBins bins, sorted
+    the first and last indices are kept to preserve the x range
+    """
+    binSize = -(-len(y) // nBins)
+    nFull = len(y) // binSize
+    yBins = y[:nFull*binSize].reshape(nFull, binSize)
+    offset = np.arange(nFull)*binSize
+    idx = [yBins.argmin(axis=1) + offset, yBins.argmax(axis=1) + offset, [0, len(y)-1]]
+    if nFull*binSize < len(y):
+        # last partial bin
+        tail = y[nFull*binSize:]
+        idx.append([nFull*binSize + tail.argmin(), nFull*binSize + tail.argmax()])
+    return np.unique(np.concatenate(idx))
+
+
 # -----------------------------------------------
 # --- Class for the data
 # -----------------------------------------------
+# position (row, column) of the axes of each PDC for a given subplots layout
+PDC_AX_POSITIONS = {
+    (2,2): ((0,0), (1,0), (1,1), (0,1)),                                 # 1 head of 2x2
+    (2,4): ((0,0), (1,0), (1,1), (0,1), (0,2), (1,2), (1,3), (0,3)),     # 2 heads of 2x2
+}
+
 class dsumPlotter:
     def __init__(self, figName, nPdcMax, autofit=True, integrate=True, timex=True, logy=False):
         """
@@ -178,6 +221,7 @@ class dsumPlotter:
         self.timex = timex
         self.logy = logy
         self.label = "DSUM"
+        self.arangeCache = {}  # data sample X axis per number of samples
         self.clearData()
         self.initAxs()
         self.initLine()
@@ -188,14 +232,31 @@ class dsumPlotter:
         reset all data to empty and ready to start
         """
         self.nEvents = [0]*self.nPdcMax
-        self.DSUM_time = [0]*self.nPdcMax
-        self.DSUM_data = [0]*self.nPdcMax
-        self.DSUM_INTEG_time = [None]*self.nPdcMax
-        self.DSUM_INTEG_data = [None]*self.nPdcMax
+        self.DSUM_time = [None]*self.nPdcMax
+        # data of all PDCs in a single array, one row per PDC, allocated on first read
+        self.allocData(nSamples=0)
         self.DSUM_PLOT_time = [0]*self.nPdcMax
         self.DSUM_PLOT_data = [0]*self.nPdcMax
+        # signature of the x data of each line, see compareXdata()
+        self.xSig = [None]*self.nPdcMax
         self.T0 = -1
         self.TNOW = -1
+        # PDCs whose plot must be updated, see updateAllData()
+        self.dirty = [True]*self.nPdcMax
+
+    def allocData(self, nSamples):
+        """
+        allocate the data arrays for nSamples per PDC, integration is reset
+        """
+        self.nSamples = nSamples
+        self.DSUM_data = np.zeros((self.nPdcMax, nSamples), dtype=np.uintc)
+        # 64 bits integration, no overflow for long acquisitions
+        self.DSUM_INTEG_data = np.zeros((self.nPdcMax, nSamples), dtype=np.int64)
+        # PDCs with data in the last event read
+        self.lastEvent = [False]*self.nPdcMax
+        # last event of the PDCs with a size different than the integration,
+        # displayed and counted but not integrated (see ingest)
+        self.DSUM_other = [None]*self.nPdcMax
 
     def initAxs(self):
         """
@@ -223,46 +284,22 @@ class dsumPlotter:
                                            figsize=(16, 9), constrained_layout=True,
                                            num=self.figName)
         self.fig.get_layout_engine().set(w_pad=0.1, h_pad=0.1, hspace=0.05, wspace=0.05)
-        for iPdc in range(self.nPdcMax):
-            self.axs[iPdc] = self._getPdcAx(iPdc=iPdc, axs=self.axes)
-
-    def _getPdcAx(self, iPdc, axs=None):
-        if np.shape(axs) == ():
-            axs = self.axs
-        if np.shape(axs) == (2,2):
-            # 1 head of 2x2
-            if iPdc == 0:
-                return axs[0, 0]
-            elif iPdc == 1:
-                return axs[1, 0]
-            elif iPdc == 2:
-                return axs[1, 1]
-            elif iPdc == 3:
-                return axs[0, 1]
-
-        elif np.shape(axs) == (2,4):
-            # 2 heads of 2x2
-            if iPdc == 0:
-                return axs[0, 0]
-            elif iPdc == 1:
-                return axs[1, 0]
-            elif iPdc == 2:
-                return axs[1, 1]
-            elif iPdc == 3:
-                return axs[0, 1]
-            elif iPdc == 4:
-                return axs[0, 2]
-            elif iPdc == 5:
-                return axs[1, 2]
-            elif iPdc == 6:
-                return axs[1, 3]
-            elif iPdc == 7:
-                return axs[0, 3]
-
-        elif np.shape(axs) == (4,8):
+        # axes of each PDC, built once from the layout of the subplots
+        axsShape = np.shape(self.axes)
+        if axsShape == (4,8):
             raise Exception(f"8x8 head board is not yet supported")
+        self.pdcAxMap = [self.axes[pos] for pos in PDC_AX_POSITIONS.get(axsShape, ())]
+        for iPdc in range(self.nPdcMax):
+            self.axs[iPdc] = self._getPdcAx(iPdc=iPdc)
+        # y scale of each axes, see updateAllData()
+        self.yscale = [ax.get_yscale() for ax in self.axs]
 
-        # should not reach here
+    def _getPdcAx(self, iPdc):
+        """
+        axes of a PDC from the lookup table built in initAxs()
+        """
+        if 0 <= iPdc < len(self.pdcAxMap):
+            return self.pdcAxMap[iPdc]
         raise Exception(f"specified iPdc {iPdc} is out of range {self.nPdcMax}")
 
 
@@ -272,97 +309,178 @@ class dsumPlotter:
         create a line for each PDC
         """
         self.line = [None]*self.nPdcMax
+        # blitting only when the backend supports it, otherwise the lines are drawn with the figure
+        self.blit = self.fig.canvas.supports_blit
         for iPdc in range(self.nPdcMax):
+            # animated lines are not part of the full figure draw, they are blitted (see pausePlot)
             self.line[iPdc] = (self.axs[iPdc].plot(self.DSUM_PLOT_time[iPdc],
-                                                   self.DSUM_PLOT_data[iPdc], '-'))[0]
+                                                   self.DSUM_PLOT_data[iPdc], '-',
+                                                   animated=self.blit,
+                                                   antialiased=not PLOT_FAST))[0]
+        for iPdc in range(self.nPdcMax):
+            self.axs[iPdc].callbacks.connect('xlim_changed',
+                                             lambda ax, iPdc=iPdc: self.onXlimChanged(iPdc=iPdc))
+        # label shown in the legend of each line, see updateAllData()
+        self.legendLabel = [None]*self.nPdcMax
+        # background of each axes without the lines, captured after each full draw
+        self.bg = None
+        self.linesChanged = False
+        self.fig.canvas.mpl_connect('draw_event', self.onDraw)
+        self.fig.canvas.draw()
         #if self.nPdcMax == 8:
         #    sep = plt.Line2D([0.5,0.5],[0.02, 0.98], color="black")
         #    self.fig.add_artist(sep)
 
 
-    def getAllPdcData(self, db):
+    def onDraw(self, event):
         """
-        read from a H5 data base object (see settings class)
+        capture the axes backgrounds after a full draw (limits, scale, legend, resize...)
+        and draw the lines on top of them
         """
-        # init empty data
-        self.DSUM_time = [0]*self.nPdcMax
-        self.DSUM_data = [0]*self.nPdcMax
-
-        # open hdf5 file
-        db.h5Open()
-
-        # get content
+        canvas = self.fig.canvas
+        if not self.blit:
+            return
+        self.bg = [canvas.copy_from_bbox(ax.bbox) for ax in self.axs]
         for iPdc in range(self.nPdcMax):
-            [self.DSUM_time[iPdc], self.DSUM_data[iPdc]] = db.getPdcDsum(iPdc=iPdc)
+            self.axs[iPdc].draw_artist(self.line[iPdc])
 
-        # close hdf5 file
-        db.h5Close()
 
-        # process the data only once the HDF5 file is closed
-        for iPdc in range(self.nPdcMax):
-            if (not np.shape(self.DSUM_data[iPdc]) == ()):
-                # data is not empty
-                if ((type(self.DSUM_INTEG_data[iPdc]) == np.ndarray) and
-                    (type(self.DSUM_data[iPdc]) == np.ndarray)):
-                    # DSUM_INTEG_data and DSUM_data are both set to a np.ndarray
-                    lenInteg = len(self.DSUM_INTEG_data[iPdc])
-                    lenNewData = len(self.DSUM_data[iPdc])
-                    if lenNewData == lenInteg:
-                        # same size data
-                        self.DSUM_INTEG_data[iPdc] += self.DSUM_data[iPdc]
-                    #elif lenNewData < lenInteg:
-                    #    # new data has less data than integration
-                    #    self.DSUM_INTEG_data[iPdc][0:lenNewData-1] += self.DSUM_data[iPdc][0:lenNewData-1]
-                    #elif lenNewData > lenInteg:
-                    #    # new data has more data than integration
-                    #    tmp = self.DSUM_INTEG_data[iPdc]
-                    #    self.DSUM_INTEG_data[iPdc] = self.DSUM_data[iPdc]
-                    #    self.DSUM_INTEG_data[iPdc][0:lenInteg-1] += tmp[0:lenInteg-1]
-                else:
-                    # init DSUM_INTEG_data to DSUM_data
-                    self.DSUM_INTEG_data[iPdc] = self.DSUM_data[iPdc]
-                # keep timestamp of first event
-                if self.T0 == -1:
-                    self.T0 = datetime.datetime.now()
-                # keep timestamp of the last event
-                self.TNOW = datetime.datetime.now()
-                # number of events changed
-                self.nEvents[iPdc] += 1
+    def getAllPdcData(self, db):
+        """
+        read from a H5 data base object (see settings class)
+        """
+        self.ingest(dsum=readAllPdcDsum(db=db, nPdcMax=self.nPdcMax, nSamples=self.nSamples))
 
-    def compareXdata(self, iPdc):
-        shapeNew = np.shape(self.DSUM_time[iPdc])
-        if (not shapeNew == ()):
-            # time data is not empty
-            shapePlot = np.shape(self.DSUM_PLOT_time[iPdc])
-            if shapePlot == ():
-                # init plot data
-                return True
-            elif shapeNew != shapePlot:
-                # different shapes, do not update data
-                return False
-            elif ((shapeNew == shapePlot) and
-                  ((self.DSUM_PLOT_time[iPdc] != self.DSUM_time[iPdc]).any())):
-                # same shape, different data, must update data
-                return True
+    def ingest(self, dsum):
+        """
+        add the [time, data] of each PDC read from a file (see readAllPdcDsum)
+        """
+        self.DSUM_time = [None]*self.nPdcMax
+        self.lastEvent = [False]*self.nPdcMax
+        self.DSUM_other = [None]*self.nPdcMax
+        notIntegrated = []
+        for iPdc, (dsumTime, dsumData) in enumerate(dsum):
+            if dsumData is None:
+                # no data for this PDC, not included in integration
+                self.DSUM_data[iPdc] = 0
+                continue
+            if len(dsumData) != self.nSamples and not any(self.nEvents):
+                # first event, size the arrays for this data
+                self.allocData(nSamples=len(dsumData))
+            if len(dsumData) != self.nSamples:
+                # different size than the integrated data, shown as last event only
+                self.DSUM_data[iPdc] = 0
+                self.DSUM_other[iPdc] = dsumData
+                notIntegrated.append(iPdc)
             else:
-                # do not update data
-                return False
+                self.DSUM_data[iPdc] = dsumData
+            self.DSUM_time[iPdc] = dsumTime
+            self.lastEvent[iPdc] = True
+            self.dirty[iPdc] = True
+            # keep timestamp of first event
+            if self.T0 == -1:
+                self.T0 = datetime.datetime.now()
+            # keep timestamp of the last event
+            self.TNOW = datetime.datetime.now()
+            # number of events changed
+            self.nEvents[iPdc] += 1
+
+        if notIntegrated:
+            print(f"{fgColors.bYellow}WARNING: data size of PDC {notIntegrated} differs from the integration "
+                  f"({self.nSamples} samples), not integrated{fgColors.endc}")
+        # integrate all PDCs at once, rows without new data are zero
+        np.add(self.DSUM_INTEG_data, self.DSUM_data, out=self.DSUM_INTEG_data, casting='safe')
+
+    @staticmethod
+    def xSignature(x):
+        """
+        the time axis is a regular grid, its size and end points are enough to identify it
+        """
+        return (len(x), x[0], x[-1]) if len(x) else (0,)
 
-    def updateAllData(self):
+    def compareXdata(self, iPdc):
         """
-        update plots
+        True when the x axis of PDC iPdc must be updated
+        """
+        if self.DSUM_time[iPdc] is None:
+            # time data is empty
+            return False
+        if self.xSig[iPdc] is None:
+            # init plot data
+            return True
+        # x data to display, time or data sample
+        newX = self.DSUM_time[iPdc] if self.timex else self.DSUM_PLOT_time[iPdc]
+        if len(newX) != self.xSig[iPdc][0]:
+            # different shapes, do not update data
+            return False
+        # same shape, update only if the x axis is different
+        return self.xSignature(newX) != self.xSig[iPdc]
+
+    def setLineData(self, iPdc):
+        """
+        set the plot data of the line of PDC iPdc
+        data longer than the axes width is reduced to the min and max of each pixel,
+        only on the visible x range (updated on zoom/pan, see onXlimChanged)
         """
-        # select data to display (integration or not)
-        if self.integrate:
-            self.DSUM_PLOT_data = self.DSUM_INTEG_data
+        x = self.DSUM_PLOT_time[iPdc]
+        y = self.DSUM_PLOT_data[iPdc]
+        nPixels = max(int(self.axs[iPdc].bbox.width), 1)
+        if np.ndim(x) == 1 and len(x) == len(y) and len(y) > 2*nPixels:
+            # visible range with one more point on each side to draw up to the edges
+            xMin, xMax = self.axs[iPdc].get_xlim()
+            iStart = max(np.searchsorted(x, xMin) - 1, 0)
+            iStop = min(np.searchsorted(x, xMax, side='right') + 1, len(x))
+            x = x[iStart:iStop]
+            y = y[iStart:iStop]
+            if len(y) > 2*nPixels:
+                idx = minMaxIndices(y, nBins=nPixels)
+                x = x[idx]
+                y = y[idx]
+            self.line[iPdc].set_data(x, y)
         else:
-            self.DSUM_PLOT_data = self.DSUM_data
+            self.line[iPdc].set_xdata(x)
+            self.line[iPdc].set_ydata(y)
 
+    def onXlimChanged(self, iPdc):
+        """
+        x axis of PDC iPdc zoomed or moved, decimate the data again for the visible range
+        """
+        if not np.shape(self.DSUM_PLOT_data[iPdc]) == ():
+            self.setLineData(iPdc=iPdc)
+            self.linesChanged = True
+
+    def updateAllData(self, allPdcs=True):
+        """
+        update plots
+        allPdcs: False to update only the PDCs with new data since the last update
+        """
         for iPdc in range(self.nPdcMax):
+            if not (allPdcs or self.dirty[iPdc]):
+                # nothing new for this PDC
+                continue
+            self.dirty[iPdc] = False
+
+            # select data to display (integration or not), only for PDCs with data
+            if self.integrate:
+                self.DSUM_PLOT_data[iPdc] = self.DSUM_INTEG_data[iPdc] if self.nEvents[iPdc] > 0 else 0
+            else:
+                if not self.lastEvent[iPdc]:
+                    self.DSUM_PLOT_data[iPdc] = 0
+                elif self.DSUM_other[iPdc] is not None:
+                    self.DSUM_PLOT_data[iPdc] = self.DSUM_other[iPdc]
+                else:
+                    self.DSUM_PLOT_data[iPdc] = self.DSUM_data[iPdc]
+
             if self.timex == False:
                 # use data sample as X axis
-                if hasattr(self.DSUM_data[iPdc], "__len__"):
-                    self.DSUM_PLOT_time[iPdc] = np.arange(0, len(self.DSUM_data[iPdc]))
+                # same read-only array for all PDCs and frames, allocated once per length
+                if np.ndim(self.DSUM_PLOT_data[iPdc]) == 1:
+                    nSamples = len(self.DSUM_PLOT_data[iPdc])
+                else:
+                    nSamples = len(self.DSUM_data[iPdc])
+                if nSamples not in self.arangeCache:
+                    self.arangeCache[nSamples] = np.arange(0, nSamples)
+                self.DSUM_PLOT_time[iPdc] = self.arangeCache[nSamples]
 
             # check if x axis must me updated
             setXlim=False
@@ -370,23 +488,25 @@ class dsumPlotter:
                 # save last time and update plot x only if values are differents
                 if self.timex:
                     self.DSUM_PLOT_time[iPdc] = self.DSUM_time[iPdc]
-                self.line[iPdc].set_xdata(self.DSUM_PLOT_time[iPdc])
+                self.xSig[iPdc] = self.xSignature(self.DSUM_PLOT_time[iPdc])
                 setXlim = True
 
-            # update y axis
+            # update y axis, with the x axis since long data is decimated
             setYlim=False
             if (not np.shape(self.DSUM_PLOT_data[iPdc]) == ()):
-                self.line[iPdc].set_ydata(self.DSUM_PLOT_data[iPdc])
+                self.setLineData(iPdc=iPdc)
+                self.linesChanged = True
                 setYlim=True
-
-            # set the y axis scale
-            yscale = self.axs[iPdc].get_yscale()
-            if self.logy and yscale != 'symlog':
-                #self.axs[iPdc].set_yscale('log')
-                self.axs[iPdc].set_yscale('symlog')
-                setYlim=True
-            elif self.logy == False and yscale != 'linear':
-                self.axs[iPdc].set_yscale('linear')
+            elif setXlim:
+                self.line[iPdc].set_xdata(self.DSUM_PLOT_time[iPdc])
+                self.linesChanged = True
+
+            # set the y axis scale, only when it changed
+            #yscale = 'log' if self.logy else 'linear'
+            yscale = 'symlog' if self.logy else 'linear'
+            if self.yscale[iPdc] != yscale:
+                self.axs[iPdc].set_yscale(yscale)
+                self.yscale[iPdc] = yscale
                 setYlim=True
 
             # adjust axes limits
@@ -394,7 +514,8 @@ class dsumPlotter:
                 set_lim(ax=self.axs[iPdc],
                         time=self.DSUM_PLOT_time[iPdc],
                         data=self.DSUM_PLOT_data[iPdc],
-                        setXlim=setXlim, setYlim=setYlim)
+                        setXlim=setXlim, setYlim=setYlim,
+                        log=self.logy)
 
 
             # update legends with number of events
@@ -403,8 +524,12 @@ class dsumPlotter:
                 eventLabel=f" - {self.nEvents[iPdc]} event"
                 if self.nEvents[iPdc] > 1:
                     eventLabel+="s"
-            self.line[iPdc].set_label(f"{self.label}{iPdc}{eventLabel}")
-            self.axs[iPdc].legend()
+            legendLabel = f"{self.label}{iPdc}{eventLabel}"
+            if legendLabel != self.legendLabel[iPdc]:
+                # rebuilding the legend is costly, only when the label changed
+                self.line[iPdc].set_label(legendLabel)
+                self.axs[iPdc].legend()
+                self.legendLabel[iPdc] = legendLabel
 
 
         # once everything is done
@@ -417,6 +542,7 @@ class dsumPlotter:
         for iPdc in range(self.nPdcMax):
             self.line[iPdc].set_xdata([self.DSUM_PLOT_time[iPdc]])
             self.line[iPdc].set_ydata([self.DSUM_PLOT_data[iPdc]])
+        self.linesChanged = True
 
 
     def checkExit(self):
@@ -432,8 +558,23 @@ class dsumPlotter:
         let user interact with a plot while waiting for new data
         """
         #plt.pause(pauseTime)  # steal the focus
-        self.fig.canvas.draw_idle()
-        self.fig.canvas.start_event_loop(pauseTime)
+        canvas = self.fig.canvas
+        if not self.blit:
+            # lines drawn with the figure, full draw when something changed
+            if self.fig.stale or self.linesChanged:
+                canvas.draw_idle()
+        elif self.fig.stale or self.bg is None:
+            # limits, scale or legend changed: full draw, backgrounds are captured in onDraw
+            canvas.draw_idle()
+        elif self.linesChanged:
+            # only the lines changed: redraw them over the saved backgrounds
+            for iPdc in range(self.nPdcMax):
+                ax = self.axs[iPdc]
+                canvas.restore_region(self.bg[iPdc])
+                ax.draw_artist(self.line[iPdc])
+                canvas.blit(ax.bbox)
+        self.linesChanged = False
+        canvas.start_event_loop(pauseTime)
 
 # -----------------------------------------------
 # --- Classes to add buttons in toolbar
@@ -452,8 +593,12 @@ class AutosizePlots(ToolBase):
 def autosizeAll(dp):
     if dp:
         for iPdc in range(dp.nPdcMax):
-            x = dp.line[iPdc].get_xdata()
-            y = dp.line[iPdc].get_ydata()
+            # full data, the lines only hold the visible decimated data
+            x = dp.DSUM_PLOT_time[iPdc]
+            y = dp.DSUM_PLOT_data[iPdc]
+            if np.size(x) == 0 or np.size(y) == 0:
+                # no data yet for this PDC
+                continue
             ax = dp.axs[iPdc]
             set_lim(ax, x, y, setXlim=True, setYlim=True)
 
@@ -577,14 +722,18 @@ class DownloadData(ToolBase):
         global dp
 
         if dp:
-            # init empty DataFrame
-            df = pd.DataFrame()
-
             # for each PDC, check if plot data is available
+            columns = {}
             for iPdc in range(dp.nPdcMax):
                 if dp.nEvents[iPdc] > 0:
-                    df.insert(loc=len(df.columns), column=f"time{iPdc}", value=dp.DSUM_PLOT_time[iPdc])
-                    df.insert(loc=len(df.columns), column=f"data{iPdc}", value=dp.DSUM_PLOT_data[iPdc])
+                    columns[f"time{iPdc}"] = dp.DSUM_PLOT_time[iPdc]
+                    columns[f"data{iPdc}"] = dp.DSUM_PLOT_data[iPdc]
+
+            # DataFrame built at once, scalars (PDC without data) are repeated on all rows
+            if any(np.ndim(value) > 0 for value in columns.values()):
+                df = pd.DataFrame(columns)
+            else:
+                df = pd.DataFrame()
 
             # if there are data to export
             if df.size > 0:
@@ -597,6 +746,23 @@ class DownloadData(ToolBase):
                 print(f"{fgColors.bYellow}WARNING: No data to save.{fgColors.endc}")
 
 
+def getSaveRoot():
+    """
+    hidden Tk root of the save dialog, created only when the user saves data
+    """
+    global saveRoot
+    if saveRoot is None:
+        saveRoot = Tk()
+        saveRoot.withdraw()  # Removes TK root window
+        # Prompt window to front
+        saveRoot.overrideredirect(True)
+        saveRoot.geometry('0x0+0+0')
+        saveRoot.lift()
+        saveRoot.focus_set()
+        saveRoot.focus_force()
+        saveRoot.attributes("-topmost", True)
+    return saveRoot
+
 # function to call when user press
 # the save button, a filedialog will
 # open and ask to save file
@@ -605,6 +771,7 @@ def save():
     if not dp:
         print(f"{fgColors.red}ERROR: database not ready. No data exported.{fgColors.endc}")
         return ""
+    root = getSaveRoot()
 
     # format default file name based on acquisition type
     dateStr=datetime.datetime.now().strftime("%Y%m%d_%Hh%Mm%S")
@@ -628,7 +795,8 @@ def save():
 
     # ask user to select a file to save data
     files = [('CSV Files', '*.csv*')]
-    userFile = str(asksaveasfilename(filetypes=files, defaultextension=files,
+    userFile = str(asksaveasfilename(parent=root,
+                                     filetypes=files, defaultextension=files,
                                      initialdir=initialdir,
                                      confirmoverwrite=True,
                                      initialfile=f"{dateStr}_DSUM{integStr}.csv"))
@@ -655,29 +823,36 @@ def save():
 # -----------------------------------------------
 # --- General purpose functions
 # -----------------------------------------------
-def set_lim(ax, time, data, setXlim=True, setYlim=True):
-    if "log" in ax.get_yscale():
-        log = True
-    else:
-        log = False
-
+def set_lim(ax, time, data, setXlim=True, setYlim=True, log=None):
+    if not (setXlim or setYlim):
+        return
+    if np.size(time) == 0 or np.size(data) == 0:
+        # empty arrays (no data yet for the PDC), nothing to fit
+        return
+    if log is None:
+        # scale not given by the caller
+        log = "log" in ax.get_yscale()
+
+    # NOTE: numpy reductions, time and data can be arrays, lists or a scalar 0 when empty
     if setXlim:
-        xMin = min(time)
-        xMax = max(time)
+        xMin = np.min(time)
+        xMax = np.max(time)
         if xMin == 0 and xMax == 0:
             # default empty limits
             ax.set_xlim(-0.055, 0.055)
         elif xMin != xMax:
             # auto limits
-            ax.set_xlim(min(time), max(time))
+            ax.set_xlim(xMin, xMax)
     if setYlim:
         try:
+            dMin = np.min(data)
+            dMax = np.max(data)
             if log:
-                yMin = min(data)/2.0
-                yMax = max(data)*2.0
+                yMin = dMin/2.0
+                yMax = dMax*2.0
             else:
-                yMin = 0.8*min(data)
-                yMax = 1.2*max(data)
+                yMin = 0.8*dMin
+                yMax = 1.2*dMax
         except:
             yMin = 0
             yMax = 0
@@ -715,6 +890,70 @@ def customizeMenu(fig):
     fig.canvas.manager.toolbar.add_tool('download', 'save', 0)
     fig.canvas.manager.toolbar.add_tool('clear', 'clear', 0)
 
+# -----------------------------------------------
+# --- Reading of the HDF5 files
+# -----------------------------------------------
+def readAllPdcDsum(db, nPdcMax, nSamples=0):
+    """
+    read the [time, data] of each PDC from a H5 data base object
+    nSamples: expected number of samples, the data of all PDCs is read in a single buffer
+    """
+    # open hdf5 file
+    db.h5Open()
+
+    # get content, PDCs with a different number of samples get their own array
+    readBuf = np.empty((nPdcMax, nSamples), dtype=np.uintc)
+    dsum = db.getAllPdcDsum(nPdc=nPdcMax, out=readBuf)
+
+    # close hdf5 file
+    db.h5Close()
+    return dsum
+
+def readerLoop(dataQueue, nPdcMax):
+    """
+    thread reading the new HDF5 files while the main thread updates the plots
+    the data of each file is put in dataQueue, blocking when the plots are late
+    an exception is put in the queue to be raised by the main thread
+    """
+    nSamples = 0
+    dirStamp = None
+    lastScan = 0
+    try:
+        while 1:
+            # listing the files reads the whole directory, skip it while the directory is unchanged
+            # (a file created, renamed or deleted changes its mtime), with a full scan
+            # every RESCAN_PRD for files filled after their creation
+            try:
+                newStamp = os.stat(HDF5_DATA_DIR).st_mtime_ns
+            except OSError:
+                newStamp = None
+            now = time.monotonic()
+            if newStamp is not None and newStamp == dirStamp and now - lastScan < RESCAN_PRD:
+                time.sleep(0.01)
+                continue
+            dirStamp = newStamp
+            lastScan = now
+
+            db = h5Reader(  deleteAfter=True,
+                            #hfRelPath="HDF5",
+                            hfAbsPath=HDF5_DATA_DIR,
+                            sysClkPrd=SYS_CLK_PRD,
+                            dsumPrd=DSUM_SAMPLE_NCLK,
+                            hfFile="")
+
+            # nothing new to read
+            if not db.newFileReady():
+                time.sleep(0.01)
+                continue
+
+            # a new buffer per file, the previous ones may still be in the queue
+            dsum = readAllPdcDsum(db=db, nPdcMax=nPdcMax, nSamples=nSamples)
+            nSamples = max((len(data) for _, data in dsum if data is not None), default=nSamples)
+            dataQueue.put(dsum)
+    except Exception as e:
+        dataQueue.put(e)
+
+
 # -----------------------------------------------
 # --- Settings for the analysis
 # -----------------------------------------------
@@ -725,33 +964,41 @@ try:
                      integrate=DEFAULT_INTEGRATE)
     customizeMenu(dp.fig)
 
+    # HDF5 files are read in the background, at most BATCH_MAX files waiting to be plotted
+    dataQueue = queue.Queue(maxsize=BATCH_MAX)
+    readerThread = threading.Thread(target=readerLoop,
+                                    args=(dataQueue, N_PDC_MAX),
+                                    daemon=True)
+    readerThread.start()
+
     while 1:
         # loop until user Ctrl+C
-        db = h5Reader(  deleteAfter=True,
-                        #hfRelPath="HDF5",
-                        hfAbsPath=HDF5_DATA_DIR,
-                        sysClkPrd=SYS_CLK_PRD,
-                        dsumPrd=DSUM_SAMPLE_NCLK,
-                        hfFile="")
+        # -----------------------------------------------
+        # --- Add the Controller Data of the waiting HDF5 files
+        # -----------------------------------------------
+        # all waiting files are added before a single redraw, the integration is the same
+        nFiles = 0
+        while nFiles < BATCH_MAX:
+            try:
+                dsum = dataQueue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(dsum, Exception):
+                # error in the reader thread
+                raise dsum
+            dp.ingest(dsum=dsum)
+            nFiles += 1
 
         # nothing new to plot
-        if not db.newFileReady():
-            #checkExit(figure_name)
-            #plotPause(fig, 0.01)
+        if nFiles == 0:
             dp.checkExit()
-            dp.pausePlot(pauseTime=0.01)
+            dp.pausePlot(pauseTime=0.02)
             continue
 
-        # -----------------------------------------------
-        # --- Open HDF5 file to get Controller Data
-        # -----------------------------------------------
-        # get all PDC data for a given event in db
-        dp.getAllPdcData(db=db)
-
         # -----------------------------------------------
         # --- Plot content
         # -----------------------------------------------
-        dp.updateAllData()
+        dp.updateAllData(allPdcs=False)
 
         # check if figure still exist
         dp.checkExit()
@@ -16,15 +16,11 @@
 #--
 #----------------------------------------------------------------------------------
 import sys, os
-import numpy as np
-import random
-import time
-import datetime
-from itertools import chain
-import statistics
-import matplotlib.pyplot as plt
 
 # custom modules
+# NOTE: numpy, matplotlib and h5Reader are not needed to configure the PDCs,
+#       they are not imported to keep the start up fast, import them where
+#       a routine added after the configuration uses them
 from modules.fgColors import fgColors
 from modules.zynqEnvHelper import PROJECT_PATH, HOST_APPS_PATH, USER_DATA_DIR, HDF5_DATA_DIR
 import modules.sshClientHelper as sshClientHelper
@@ -34,12 +30,14 @@ from modules.zynqDataTransfer import zynqDataTransfer
 from modules.systemHelper import sectionPrint
 from modules.pdcHelper import *
 #from modules.zynqHelper import *
-from modules.h5Reader import *
+
+# progress headers only with PDC_VERBOSE=1, the PDC settings are always printed
+_V = systemHelper.VERBOSE
 
 # -----------------------------------------------
 # --- open a connection with the ZCU102 board
 # -----------------------------------------------
-sectionPrint("open a connection with the ZCU102 board")
+if _V: sectionPrint("open a connection with the ZCU102 board")
 # parameters of the ZCU102 board
 # open a client based on its name in the ssh config file
 client = sshClientHelper.sshClientFromCfg(hostCfgName="zcudev")
@@ -47,7 +45,7 @@ client = sshClientHelper.sshClientFromCfg(hostCfgName="zcudev")
 # -----------------------------------------------
 # --- prepare Zynq platform
 # -----------------------------------------------
-sectionPrint("prepare Zynq platform")
+if _V: sectionPrint("prepare Zynq platform")
 zynq = zynqDataTransfer(sshClientZynq=client)
 zynq.init()
 
@@ -62,54 +60,57 @@ zynq.init()
 #       pdcEn=0xF -> PDC0, PDC1, PDC2, PDC3
 icp = initCtlPdcFromClient(client=client, sysClkPrd=10e-9, pdcEn=0xF)
 
-# -----------------------------------------------
-# --- set system clock period
-# -----------------------------------------------
-icp.setSysClkPrd()
-
-# -----------------------------------------------
-# --- reset of the controller
-# -----------------------------------------------
-icp.resetCtl()
-
-# -----------------------------------------------
-# --- configure controller packet
-# -----------------------------------------------
-# NOTE always set SCSA register first to store other configuration registers in HDF5
-# configure CFG_STATUS_A
-    # 0x8000 = PDC_CFG
-    # 0x4000 = CTL_CFG
-    # 0x2000 = PDC_STATUS
-    # 0x1000 = PDC_STATUS_ALL
-    # 0x0007 = ALL CTL_STATUS
-SCSA = 0x0000
-# configure CTL_DATA_A
-SCDA = 0x0000
-# configure PDC_DATA_A
-    # 0x0100 = DSUM
-    # 0x00F7 = ZPP
-SPDA = 0x00F7
-icp.setCtlPacket(bank=packetBank.BANKA, SCS=SCSA, SCD=SCDA, SPD=SPDA)
-
-# -----------------------------------------------
-# --- set delay of CFG_DATA pins
-# -----------------------------------------------
-icp.setDelay(signal="CFG_DATA", delay=300)
-
-# -----------------------------------------------
-# --- check for power good
-# -----------------------------------------------
-icp.checkPowerGood()
-
-# -----------------------------------------------
-# --- enable CFG_RTN_EN
-# -----------------------------------------------
-icp.setCfgRtnEn()
-
-# -----------------------------------------------
-# --- prepare PDC for configuration
-# -----------------------------------------------
-icp.preparePDC()
+# NOTE: the controller commands are sent in a single remote shell,
+#       reads (e.g. checkPowerGood) send the commands queued before them
+with icp.batch():
+    # -----------------------------------------------
+    # --- set system clock period
+    # -----------------------------------------------
+    icp.setSysClkPrd()
+
+    # -----------------------------------------------
+    # --- reset of the controller
+    # -----------------------------------------------
+    icp.resetCtl()
+
+    # -----------------------------------------------
+    # --- configure controller packet
+    # -----------------------------------------------
+    # NOTE always set SCSA register first to store other configuration registers in HDF5
+    # configure CFG_STATUS_A
+        # 0x8000 = PDC_CFG
+        # 0x4000 = CTL_CFG
+        # 0x2000 = PDC_STATUS
+        # 0x1000 = PDC_STATUS_ALL
+        # 0x0007 = ALL CTL_STATUS
+    SCSA = 0x0000
+    # configure CTL_DATA_A
+    SCDA = 0x0000
+    # configure PDC_DATA_A
+        # 0x0100 = DSUM
+        # 0x00F7 = ZPP
+    SPDA = 0x00F7
+    icp.setCtlPacket(bank=packetBank.BANKA, SCS=SCSA, SCD=SCDA, SPD=SPDA)
+
+    # -----------------------------------------------
+    # --- set delay of CFG_DATA pins
+    # -----------------------------------------------
+    icp.setDelay(signal="CFG_DATA", delay=300)
+
+    # -----------------------------------------------
+    # --- check for power good
+    # -----------------------------------------------
+    icp.checkPowerGood()
+
+    # -----------------------------------------------
+    # --- enable CFG_RTN_EN
+    # -----------------------------------------------
+    icp.setCfgRtnEn()
+
+    # -----------------------------------------------
+    # --- prepare PDC for configuration
+    # -----------------------------------------------
+    icp.preparePDC()
 
 # -----------------------------------------------
 # --- Using all of the 4096 pixels,
@@ -123,12 +124,19 @@ icp.preparePDC()
 # --------------------------
 # --- configure the PDCs ---
 # --------------------------
-sectionPrint("configure the PDCs")
+if _V: sectionPrint("configure the PDCs")
 PDC_SETTING = pdc_setting()
-client.runPrint("ctlCmd -c MODE_CFG")  # set PDCs to configuration mode
+# NOTE: the written registers are known, they are not read back after each write
+#       (set verify=True to display them), validPdcCfg checks the configuration
+REG_CACHE = pdc_reg_cache(verify=False)
+# NOTE: the configuration commands are gathered and sent in a single remote shell,
+#       the result of each command is displayed once all of them are executed
+cfgCmds = []
+cfgCmds.append("ctlCmd -c MODE_CFG")  # set PDCs to configuration mode
+# registers written with pdcCfg, all sent after their settings (see below)
+PDC_REGS = {}
 
 # === PIXL REGISTER ===
-print("\n=== PIXL REGISTER ===")
 # active quenching of the front-end
 ACTIVE_QC_EN = 1; # 0=disabled/passive, 1=enabled/active
 # trigger using QC front-end (FE) or digital only (DGTL)
@@ -138,94 +146,101 @@ FLAG_EN = 1; # 1=enabled, 0=disabled
 # EDGE_LVLN and DIS_MEM on synchronizer
 EDGE_LVLN = 0
 DIS_MEM = 0
-PIXL = ((DIS_MEM<<13) + (EDGE_LVLN<<12) + (FLAG_EN<<8) + (TRG_DGTL_FEN<<4) + (ACTIVE_QC_EN<<1))
-client.runPrint(f"pdcCfg -a PIXL -r {PIXL} -g")  # configure pixel register
-PDC_SETTING.PIXL = PIXL
-
-# === TIME REGISTER ===
-print("\n=== TIME REGISTER ===")
-HOLD_TIME = 150.0
-RECH_TIME = 10.0
-FLAG_TIME = 10.0
-client.runPrint(f"pdcTime --hold {HOLD_TIME} --rech {RECH_TIME} --flag {FLAG_TIME} -g")
-PDC_SETTING.TIME = client.runReturnSplitInt('pdcTime -g')
-
+PIXL = setPdcPixlReg(activeQcEn=ACTIVE_QC_EN, trgDgtlFen=TRG_DGTL_FEN, flagEn=FLAG_EN,
+                     edgeLvln=EDGE_LVLN, disMem=DIS_MEM)
+PDC_REGS["PIXL"] = PIXL  # configure pixel register
 
 # === ANLG REGISTER ===
-print("\n=== ANLG REGISTER ===")
 ANLG = 0x0000; # disabled
 #ANLG = 0x001F; # full amplitude (~30 µA)
-client.runPrint(f"pdcCfg -a ANLG -r {ANLG} -g")  # set analog monitor
-PDC_SETTING.ANLG = ANLG
+PDC_REGS["ANLG"] = ANLG  # set analog monitor
 
 # === XXXX REGISTER ===
 # skipping registers STHH to DTXC
 
 # === OUTD REGISTER ===
-print("\n=== OUTD REGISTER ===")
 #DATA_FUNC = OUT_MUX.FLAG
 #DATA_FUNC = OUT_MUX.TRG
 DATA_FUNC = OUT_MUX.PIX_QC
 #DATA_FUNC = OUT_MUX.VSS
 #DATA_FUNC = OUT_MUX.VDD
-OUTD = (DATA_FUNC & 0x1F) + ((DATA_FUNC & 0x1F)<<6)
-client.runPrint(f"pdcCfg -a OUTD -r 0x{OUTD:04x} -g")
-PDC_SETTING.OUTD = OUTD
+OUTD = setPdcOutReg(DATA_FUNC, DATA_FUNC)
+PDC_REGS["OUTD"] = OUTD
 
 # === OUTF REGISTER ===
-print("\n=== OUTF REGISTER ===")
 FLAG_FUNC = OUT_MUX.FLAG
 #FLAG_FUNC = OUT_MUX.TRG
 #FLAG_FUNC = OUT_MUX.VSS
 #FLAG_FUNC = OUT_MUX.VDD
-OUTF = (FLAG_FUNC & 0x1F) + ((FLAG_FUNC & 0x1F)<<6)
-client.runPrint(f"pdcCfg -a OUTF -r 0x{OUTF:04x} -g")
-PDC_SETTING.OUTF = OUTF
+OUTF = setPdcOutReg(FLAG_FUNC, FLAG_FUNC)
+PDC_REGS["OUTF"] = OUTF
 
 # === TRGC REGISTER ===
-print("\n=== TRGC REGISTER ===")
 TRGC = 0x0000
-client.runPrint(f"pdcCfg -a TRGC -r {TRGC} -g")  # disable trigger command
-PDC_SETTING.TRGC = TRGC
+PDC_REGS["TRGC"] = TRGC  # disable trigger command
+
+# write all the registers
+cfgCmds.extend(REG_CACHE.cfgCmds(PDC_REGS))
+for reg, value in PDC_REGS.items():
+    setattr(PDC_SETTING, reg, value)
+
+# === TIME REGISTER ===
+HOLD_TIME = 150.0
+RECH_TIME = 10.0
+FLAG_TIME = 10.0
+cfgCmds.append(f"pdcTime --hold {HOLD_TIME} --rech {RECH_TIME} --flag {FLAG_TIME}")
+cfgCmds.append('pdcTime -g')  # register value computed by pdcTime, see PDC_SETTING.TIME below
+iTimeRead = len(cfgCmds)-1
 
 # === DISABLE ALL THE PIXELS ===
-print("\n=== DISABLE ALL THE PIXELS ===")
     # NOTE: pdcPix returns the PDC to acquisition mode,
     #       if mode is not specified
-client.runPrint("pdcPix --dis --mode NONE")
+cfgCmds.append("pdcPix --dis --mode NONE")
 
 # Enable some pixels
-print("\n=== ENABLE SOME PIXELS ===")
 # NOTE: see pdcPix app help to see available options
-pixIndex = 0
-client.runPrint(f"pdcPix --index {pixIndex} --mode NONE")
+#       the pixels to enable are all sent with the other configuration commands
+pixIndices = [0]
+cfgCmds.extend(pdcPixEnCmds(pixIndices, mode="NONE"))
 #AS - replace L201 with output from getSpadTcrUsingFlag
-#client.runPrint(f"pdcSpad --pattern 0x{spadEnPattern:016x} --mode NONE")
+#cfgCmds.append(f"pdcSpad --pattern 0x{spadEnPattern:016x} --mode NONE")
+
+# === SEND THE CONFIGURATION ===
+if _V: print("\n=== SEND THE CONFIGURATION ===")
+cfgOut = client.runBatchReturn(cfgCmds)
+try:
+    PDC_SETTING.TIME = int(cfgOut[iTimeRead][0].split()[-1], base=0)  # as runReturnSplitInt
+except (IndexError, ValueError):
+    # no output (command failed or batch stopped before it) or not a register value
+    print(f"{fgColors.red}ERROR: could not read the TIME register, '{cfgCmds[iTimeRead]}' returned: {cfgOut[iTimeRead]}{fgColors.endc}")
+    sys.exit()
 
 # === VALIDATE CONFIGURATIONS ===
-print("\n=== VALIDATE CONFIGURATIONS ===")
+if _V: print("\n=== VALIDATE CONFIGURATIONS ===")
 icp.validPdcCfg()
 
 # === OUTC REGISTER ===
-print("\n=== OUTC REGISTER ===")
+if _V: print("\n=== OUTC REGISTER ===")
     # disable configuration output last once configuration was validated
 FLAG_CFG_FUNC = OUT_MUX.CLK_CS     # default function
 #FLAG_CFG_FUNC = OUT_MUX.VSS        # disabled
 DATA_CFG_FUNC = OUT_MUX.CFG_VALID  # default function
 #DATA_CFG_FUNC = OUT_MUX.VSS        # disabled
-OUTC = (DATA_CFG_FUNC & 0x1F) + ((FLAG_CFG_FUNC & 0x1F)<<6)
-client.runPrint(f"pdcCfg -a OUTC -r 0x{OUTC:04x} -g")
+OUTC = setPdcOutReg(DATA_CFG_FUNC, FLAG_CFG_FUNC)
 PDC_SETTING.OUTC = OUTC
 
-# print the settings of all the PDCs
-print("\n=== PDC SETTINGS ===")
-PDC_SETTING.print()
-
 # ---------------------------------------
 # --- return PDCs to acquisition mode ---
 # ---------------------------------------
-sectionPrint("return PDCs to acquisition mode")
-client.runPrint(f"ctlCmd -c MODE_ACQ")
+if _V: sectionPrint("return PDCs to acquisition mode")
+# NOTE: commands are written in order on the configuration bus of the PDCs,
+#       they are sent together in one remote shell rather than on parallel sessions
+client.runBatch([REG_CACHE.cfgCmd("OUTC", OUTC),
+                 f"ctlCmd -c MODE_ACQ"])
+
+# print the settings of all the PDCs
+print("\n=== PDC SETTINGS ===")
+PDC_SETTING.print()
 
 # ready to operate
 print("\n=== READY TO OPERATE ===")
@@ -22,10 +22,10 @@ import random
 import time
 import datetime
 from itertools import chain
-import statistics
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 # custom modules
 from modules.fgColors import fgColors
@@ -52,6 +52,10 @@ test_start_time = time.time()
 # -----------------------------------------------
 # database of the data
 tp = None
+# polling of the HDF5 directory while waiting for a file (seconds)
+H5_POLL_PRD = 0.001
+# full scan period, for files filled after their creation (seconds)
+H5_RESCAN_PRD = 0.05
 
 # -----------------------------------------------
 # --- open a connection with the ZCU102 board
@@ -73,54 +77,57 @@ zynq.init()
 icp = initCtlPdcFromClient(client=client, sysClkPrd=10e-9, pdcEn=0xF)
 
 
-# -----------------------------------------------
-# --- set system clock period
-# -----------------------------------------------
-icp.setSysClkPrd()
-
-# -----------------------------------------------
-# --- reset of the controller
-# -----------------------------------------------
-icp.resetCtl()
-
-# -----------------------------------------------
-# --- configure controller packet
-# -----------------------------------------------
-# NOTE always set SCSA register first to store other configuration registers in HDF5
-# configure CFG_STATUS_A
-    # 0x8000 = PDC_CFG
-    # 0x4000 = CTL_CFG
-    # 0x2000 = PDC_STATUS
-    # 0x1000 = PDC_STATUS_ALL
-    # 0x0007 = ALL CTL_STATUS
-SCSA = 0x0000
-# configure CTL_DATA_A
-SCDA = 0x0000
-# configure PDC_DATA_A
-    # 0x0100 = DSUM
-    # 0x00F7 = ZPP
-SPDA = 0x00F7
-icp.setCtlPacket(bank=packetBank.BANKA, SCS=SCSA, SCD=SCDA, SPD=SPDA)
-
-# -----------------------------------------------
-# --- set delay of CFG_DATA pins
-# -----------------------------------------------
-icp.setDelay(signal="CFG_DATA", delay=300)
-
-# -----------------------------------------------
-# --- check for power good
-# -----------------------------------------------
-icp.checkPowerGood()
-
-# -----------------------------------------------
-# --- enable CFG_RTN_EN
-# -----------------------------------------------
-icp.setCfgRtnEn()
-
-# -----------------------------------------------
-# --- prepare PDC for configuration
-# -----------------------------------------------
-icp.preparePDC()
+# NOTE: the controller commands are sent in a single remote shell,
+#       reads (e.g. checkPowerGood) send the commands queued before them
+with icp.batch():
+    # -----------------------------------------------
+    # --- set system clock period
+    # -----------------------------------------------
+    icp.setSysClkPrd()
+
+    # -----------------------------------------------
+    # --- reset of the controller
+    # -----------------------------------------------
+    icp.resetCtl()
+
+    # -----------------------------------------------
+    # --- configure controller packet
+    # -----------------------------------------------
+    # NOTE always set SCSA register first to store other configuration registers in HDF5
+    # configure CFG_STATUS_A
+        # 0x8000 = PDC_CFG
+        # 0x4000 = CTL_CFG
+        # 0x2000 = PDC_STATUS
+        # 0x1000 = PDC_STATUS_ALL
+        # 0x0007 = ALL CTL_STATUS
+    SCSA = 0x0000
+    # configure CTL_DATA_A
+    SCDA = 0x0000
+    # configure PDC_DATA_A
+        # 0x0100 = DSUM
+        # 0x00F7 = ZPP
+    SPDA = 0x00F7
+    icp.setCtlPacket(bank=packetBank.BANKA, SCS=SCSA, SCD=SCDA, SPD=SPDA)
+
+    # -----------------------------------------------
+    # --- set delay of CFG_DATA pins
+    # -----------------------------------------------
+    icp.setDelay(signal="CFG_DATA", delay=300)
+
+    # -----------------------------------------------
+    # --- check for power good
+    # -----------------------------------------------
+    icp.checkPowerGood()
+
+    # -----------------------------------------------
+    # --- enable CFG_RTN_EN
+    # -----------------------------------------------
+    icp.setCfgRtnEn()
+
+    # -----------------------------------------------
+    # --- prepare PDC for configuration
+    # -----------------------------------------------
+    icp.preparePDC()
 
 # -----------------------------------------------
 # --- Testing all the pixels,
@@ -135,10 +142,16 @@ pixStep = 1 # 1 = test all pixels, 64 = test 1 out of 64
 # --------------------------
 sectionPrint("configure the PDCs")
 PDC_SETTING = pdc_setting()
-client.runPrint("ctlCmd -c MODE_CFG")  # set PDCs to configuration mode
+# NOTE: each register is read back (-g) to display it
+REG_CACHE = pdc_reg_cache(verify=True)
+# NOTE: the configuration commands are gathered and sent in a single remote shell,
+#       the result of each command is displayed once all of them are executed
+cfgCmds = []
+cfgCmds.append("ctlCmd -c MODE_CFG")  # set PDCs to configuration mode
+# registers written with pdcCfg, all sent after their settings (see below)
+PDC_REGS = {}
 
 # === PIXL REGISTER ===
-print("\n=== PIXL REGISTER ===")
 # active quenching of the front-end
 ACTIVE_QC_EN = 0; # 0=disabled/passive, 1=enabled/active
 # trigger using QC front-end (FE) or digital only (DGTL)
@@ -148,61 +161,66 @@ FLAG_EN = 1; # 1=enabled, 0=disabled
 # EDGE_LVLN and DIS_MEM on synchronizer
 EDGE_LVLN = 0
 DIS_MEM = 0
-PIXL = ((DIS_MEM<<13) + (EDGE_LVLN<<12) + (FLAG_EN<<8) + (TRG_DGTL_FEN<<4) + (ACTIVE_QC_EN<<1))
-client.runPrint(f"pdcCfg -a PIXL -r {PIXL} -g")  # configure pixel register
-PDC_SETTING.PIXL = PIXL
-
-# === TIME REGISTER ===
-print("\n=== TIME REGISTER ===")
-HOLD_TIME = 150.0
-RECH_TIME = 10.0
-FLAG_TIME = 10.0
-client.runPrint(f"pdcTime --hold {HOLD_TIME} --rech {RECH_TIME} --flag {FLAG_TIME} -g")
-PDC_SETTING.TIME = client.runReturnSplitInt('pdcTime -g')
-
+PIXL = setPdcPixlReg(activeQcEn=ACTIVE_QC_EN, trgDgtlFen=TRG_DGTL_FEN, flagEn=FLAG_EN,
+                     edgeLvln=EDGE_LVLN, disMem=DIS_MEM)
+PDC_REGS["PIXL"] = PIXL  # configure pixel register
 
 # === ANLG REGISTER ===
-print("\n=== ANLG REGISTER ===")
 #ANLG = 0x0000; # disabled
 ANLG = 0x001F; # full amplitude (~30 µA)
-client.runPrint(f"pdcCfg -a ANLG -r {ANLG} -g")  # set analog monitor
-PDC_SETTING.ANLG = ANLG
+PDC_REGS["ANLG"] = ANLG  # set analog monitor
 
 # === XXXX REGISTER ===
 # skipping registers STHH to DTXC
 
 # === OUTD REGISTER ===
-print("\n=== OUTD REGISTER ===")
 #DATA_FUNC = OUT_MUX.FLAG
 #DATA_FUNC = OUT_MUX.TRG
 #DATA_FUNC = OUT_MUX.PIX_QC
 DATA_FUNC = OUT_MUX.VSS
 #DATA_FUNC = OUT_MUX.VDD
-OUTD = (DATA_FUNC & 0x1F) + ((DATA_FUNC & 0x1F)<<6)
-client.runPrint(f"pdcCfg -a OUTD -r 0x{OUTD:04x} -g")
-PDC_SETTING.OUTD = OUTD
+OUTD = setPdcOutReg(DATA_FUNC, DATA_FUNC)
+PDC_REGS["OUTD"] = OUTD
 
 # === OUTF REGISTER ===
-print("\n=== OUTF REGISTER ===")
 FLAG_FUNC = OUT_MUX.FLAG
 #FLAG_FUNC = OUT_MUX.TRG
 #FLAG_FUNC = OUT_MUX.VSS
 #FLAG_FUNC = OUT_MUX.VDD
 #FLAG_FUNC = OUT_MUX.CFG_CLK
-OUTF = (FLAG_FUNC & 0x1F) + ((FLAG_FUNC & 0x1F)<<6)
-client.runPrint(f"pdcCfg -a OUTF -r 0x{OUTF:04x} -g")
-PDC_SETTING.OUTF = OUTF
+OUTF = setPdcOutReg(FLAG_FUNC, FLAG_FUNC)
+PDC_REGS["OUTF"] = OUTF
 
 # === TRGC REGISTER ===
-print("\n=== TRGC REGISTER ===")
 TRGC = 0x0000
-client.runPrint(f"pdcCfg -a TRGC -r {TRGC} -g")  # disable trigger command
-PDC_SETTING.TRGC = TRGC
+PDC_REGS["TRGC"] = TRGC  # disable trigger command
+
+# write all the registers
+cfgCmds.extend(REG_CACHE.cfgCmds(PDC_REGS))
+for reg, value in PDC_REGS.items():
+    setattr(PDC_SETTING, reg, value)
+
+# === TIME REGISTER ===
+HOLD_TIME = 150.0
+RECH_TIME = 10.0
+FLAG_TIME = 10.0
+cfgCmds.append(f"pdcTime --hold {HOLD_TIME} --rech {RECH_TIME} --flag {FLAG_TIME} -g")
+cfgCmds.append('pdcTime -g')  # register value computed by pdcTime, see PDC_SETTING.TIME below
+iTimeRead = len(cfgCmds)-1
 
 # === DISABLE ALL THE PIXELS ===
-print("\n=== DISABLE ALL THE PIXELS ===")
     # NOTE pdcPix returns the PDC to acquisition mode NOTE
-client.runPrint("pdcPix --dis")
+cfgCmds.append("pdcPix --dis")
+
+# === SEND THE CONFIGURATION ===
+print("\n=== SEND THE CONFIGURATION ===")
+cfgOut = client.runBatchReturn(cfgCmds)
+try:
+    PDC_SETTING.TIME = int(cfgOut[iTimeRead][0].split()[-1], base=0)  # as runReturnSplitInt
+except (IndexError, ValueError):
+    # no output (command failed or batch stopped before it) or not a register value
+    print(f"{fgColors.red}ERROR: could not read the TIME register, '{cfgCmds[iTimeRead]}' returned: {cfgOut[iTimeRead]}{fgColors.endc}")
+    sys.exit()
 
 # === VALIDATE CONFIGURATIONS ===
 print("\n=== VALIDATE CONFIGURATIONS ===")
@@ -215,8 +233,8 @@ print("\n=== OUTC REGISTER ===")
 FLAG_CFG_FUNC = OUT_MUX.VSS        # disabled
 #DATA_CFG_FUNC = OUT_MUX.CFG_VALID  # default function
 DATA_CFG_FUNC = OUT_MUX.VSS        # disabled
-OUTC = (DATA_CFG_FUNC & 0x1F) + ((FLAG_CFG_FUNC & 0x1F)<<6)
-client.runPrint(f"pdcCfg -a OUTC -r 0x{OUTC:04x} -g")
+OUTC = setPdcOutReg(DATA_CFG_FUNC, FLAG_CFG_FUNC)
+client.runPrint(REG_CACHE.cfgCmd("OUTC", OUTC))
 PDC_SETTING.OUTC = OUTC
 
 # print the settings of all the PDCs
@@ -243,17 +261,19 @@ N_TRG_ON = int(TRG_ON/CLK_PRD)
 N_TRG_OFF = int(N_TRG_CYC-N_TRG_ON)
 measTime = 2*N_TRG*TRG_PRD # ZPP period in seconds
 
+# NOTE: the trigger and ZPP settings are sent together in a single remote shell (see below)
+ctlCmds = []
 # make sure to disable before changing settings
-client.runPrint(f"ctlCfg -a TRGN -r 0x0000 -g")
+ctlCmds.append(f"ctlCfg -a TRGN -r 0x0000 -g")
 
-client.runPrint(f"ctlCfg -a TRG0 -r 0x{icp.pdcEnUser:04x} -g")
-client.runPrint(f"ctlCfg -a TRG1 -r 0x0000 -g")
-client.runPrint(f"ctlCfg -a TRG2 -r 0x0000 -g")
-client.runPrint(f"ctlCfg -a TRG3 -r 0x0000 -g")
-client.runPrint(f"ctlCfg -a TRGS -r 0x0000 -g")
+ctlCmds.append(f"ctlCfg -a TRG0 -r 0x{icp.pdcEnUser:04x} -g")
+ctlCmds.append(f"ctlCfg -a TRG1 -r 0x0000 -g")
+ctlCmds.append(f"ctlCfg -a TRG2 -r 0x0000 -g")
+ctlCmds.append(f"ctlCfg -a TRG3 -r 0x0000 -g")
+ctlCmds.append(f"ctlCfg -a TRGS -r 0x0000 -g")
 
-client.runPrint(f"ctlCfg -a TRGH -r 0x{N_TRG_ON:04x} -g")
-client.runPrint(f"ctlCfg -a TRGL -r 0x{N_TRG_OFF:04x} -g")
+ctlCmds.append(f"ctlCfg -a TRGH -r 0x{N_TRG_ON:04x} -g")
+ctlCmds.append(f"ctlCfg -a TRGL -r 0x{N_TRG_OFF:04x} -g")
 
 
 # ---------------------------------------
@@ -262,23 +282,24 @@ client.runPrint(f"ctlCfg -a TRGL -r 0x{N_TRG_OFF:04x} -g")
 sectionPrint("configure Controller ZPP module")
 CLK_PRD = icp.sysClkPrd
 
-print("  Configure ZPP Timer High Period")
+# ZPP Timer High Period
 ZPP_HIGH_PRD=measTime # seconds
 ZPP_HIGH_REG=int(ZPP_HIGH_PRD/CLK_PRD)
-client.runPrint(f"ctlCfg -a ZPH0 -r 0x{ZPP_HIGH_REG&0xFFFF:04x} -g")
-client.runPrint(f"ctlCfg -a ZPH1 -r 0x{(ZPP_HIGH_REG>>16)&0xFFFF:04x} -g")
+ctlCmds.append(f"ctlCfg -a ZPH0 -r 0x{ZPP_HIGH_REG&0xFFFF:04x} -g")
+ctlCmds.append(f"ctlCfg -a ZPH1 -r 0x{(ZPP_HIGH_REG>>16)&0xFFFF:04x} -g")
 
-print("  Configure ZPP Timer Low Period")
+# ZPP Timer Low Period
 ZPP_LOW_PRD=CLK_PRD
 ZPP_LOW_REG=int(ZPP_LOW_PRD/CLK_PRD)
-client.runPrint(f"ctlCfg -a ZPL0 -r 0x{ZPP_LOW_REG&0xFFFF:04x} -g")
-client.runPrint(f"ctlCfg -a ZPL1 -r 0x{(ZPP_LOW_REG>>16)&0xFFFF|0x8000:04x} -g")  # |0x8000 to enable ZPP
+ctlCmds.append(f"ctlCfg -a ZPL0 -r 0x{ZPP_LOW_REG&0xFFFF:04x} -g")
+ctlCmds.append(f"ctlCfg -a ZPL1 -r 0x{(ZPP_LOW_REG>>16)&0xFFFF|0x8000:04x} -g")  # |0x8000 to enable ZPP
 
 
 # ------------------------------------------------
 # --- Prepare Controller FSM for the acquisition
 # ------------------------------------------------
-client.run(f"ctlCfg -a FSMM -r 0x0101 -g"); # triggered by a COMMAND
+ctlCmds.append(f"ctlCfg -a FSMM -r 0x0101 -g")  # triggered by a COMMAND
+client.runBatch(ctlCmds)
 
 # --------------------------------------------------
 # --- Class to generate the display of the results
@@ -296,14 +317,24 @@ class tcrPlotter:
         self.pdcValid = [False]*self.nPdcMax
 
         # data
-        self.spadIdx = range(0, self.nSpad)
-        self.spadTcr = [[0]*self.nSpad for iPdc in range(self.nPdcMax)]
+        self.spadIdx = np.arange(self.nSpad)
+        # TOT counts of each SPAD (integers, exported as is in the CSV)
+        self.spadTcr = np.zeros((self.nPdcMax, self.nSpad), dtype=np.int64)
+        # scatter offsets, x is the SPAD index (set_offsets copies them)
+        self.tcrOffsets = np.empty((self.nSpad, 2))
+        self.tcrOffsets[:, 0] = self.spadIdx
         self.spad100 = [[] for iPdc in range(self.nPdcMax)]
         self.spadPop = [[] for iPdc in range(self.nPdcMax)]
 
         self.spadCumul100 = []
         self.spadCumulHis = []
 
+        # new values are stored unsorted, sorted once by sortData before display or export
+        self.spadPopBuf = [np.empty(self.nSpad) for iPdc in range(self.nPdcMax)]
+        self.spadPopN = [0]*self.nPdcMax
+        self.spadCumulBuf = np.empty(self.nPdcMax*self.nSpad)
+        self.spadCumulN = 0
+
         self.spadEn = [4096]*self.nPdcMax
 
         # plot constants
@@ -345,6 +376,9 @@ class tcrPlotter:
         self.colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
 
         # show empty data for all axes
+        # animated artists are not part of the full figure draw, they are blitted (see pausePlot)
+        # blitting only when the backend supports it, otherwise they are drawn with the figure
+        self.blit = self.fig.canvas.supports_blit
         self.hscatterTcr = [None]*self.nPdcMax
         self.linePopu = [None]*(self.nPdcMax+1)
         self.label = [""]*self.nPdcMax
@@ -357,32 +391,38 @@ class tcrPlotter:
                                                                      edgecolors=self.colors[iPdc],
                                                                      linewidth=1.5,
                                                                      label=self.label[iPdc],
-                                                                     alpha=0.6)
+                                                                     alpha=0.6,
+                                                                     animated=self.blit)
             # sorted population for each PDC
             self.linePopu[iPdc] = (self.axes.flat[self.axPop].plot(self.spad100[iPdc],
                                                                   self.spadPop[iPdc],
-                                                                  label=self.label[iPdc]))[0]
+                                                                  label=self.label[iPdc],
+                                                                  animated=self.blit))[0]
         # cumulative population of all PDCs
         self.lineCumulLabel = f"All PDCs"
         self.lineCumul = (self.axes.flat[self.axPop].plot(self.spadCumul100,
                                                           self.spadCumulHis,
                                                           label=self.lineCumulLabel,
-                                                          linewidth=2.0))[0]
+                                                          linewidth=2.0,
+                                                          animated=self.blit))[0]
         # statistics of the population
         self.lineCumulAvgLabel = f"{'All PDCs': <12} {'avg': <14}"
         self.lineCumulAvg = (self.axes.flat[self.axPop].plot([-1, 101], [0, 0], '--',
                                                              label=self.lineCumulAvgLabel,
-                                                             linewidth=2.0))[0]
+                                                             linewidth=2.0,
+                                                             animated=self.blit))[0]
         self.lineCumulMedLabel = f"{'All PDCs': <12} {'': <17} {'med': <14}"
         self.lineCumulMed = (self.axes.flat[self.axPop].plot([-1, 101], [0, 0], '--',
                                                              label=self.lineCumulMedLabel,
-                                                             linewidth=2.0))[0]
+                                                             linewidth=2.0,
+                                                             animated=self.blit))[0]
 
         # set titles
         self.axes.flat[self.axTcr].title.set_text("TCR as a function of the SPAD index")
         self.axes.flat[self.axPop].title.set_text("Histogram of TCR")
 
         # show legends
+        self.legendLabels = None
         self.updateLegend()
 
         # log y axis
@@ -409,10 +449,44 @@ class tcrPlotter:
         set_lim(self.axes.flat[self.axTcr], self.spadTcr)
         set_lim(self.axes.flat[self.axPop], self.spadPop)
 
+        # axes backgrounds for blitting, captured at each full draw
+        self.bg = None
+        self.fig.canvas.mpl_connect('draw_event', self.onDraw)
+        self.fig.canvas.draw()
+
+    def animatedArtists(self):
+        """
+        animated artists of each axis, in the order of self.axes.flat
+        """
+        artists = [[] for ax in self.axes.flat]
+        artists[self.axTcr] = list(self.hscatterTcr)
+        artists[self.axPop] = self.linePopu[:self.nPdcMax] + [self.lineCumul,
+                                                              self.lineCumulAvg,
+                                                              self.lineCumulMed]
+        return artists
+
+    def onDraw(self, event):
+        """
+        capture the axes backgrounds after a full draw (limits, legend, resize...)
+        and draw the animated artists on top of them
+        """
+        canvas = self.fig.canvas
+        if not self.blit:
+            return
+        self.bg = [canvas.copy_from_bbox(ax.bbox) for ax in self.axes.flat]
+        for ax, artists in zip(self.axes.flat, self.animatedArtists()):
+            for artist in artists:
+                ax.draw_artist(artist)
+
     def updateLegend(self):
         """
         show/update legends with proper parameters
         """
+        # a new legend redraws the whole figure, only when a label changed
+        labels = tuple(artist.get_label() for artists in self.animatedArtists() for artist in artists)
+        if labels == self.legendLabels:
+            return
+        self.legendLabels = labels
         self.axes.flat[self.axTcr].legend()
         self.axes.flat[self.axPop].legend(loc="upper left", title=f"{'': <26} {'avg': <14} {'med': <14}")
 
@@ -425,6 +499,7 @@ class tcrPlotter:
         else:
             pdcRange = [iPdc]
 
+        self.sortData()
         for iPdc in pdcRange:
             if not self.pdcValid[iPdc]:
                 # PDC is not valid, remove it from the legend
@@ -434,25 +509,24 @@ class tcrPlotter:
             else:
                 # update scatter
                 self.hscatterTcr[iPdc].set_label(s=self.label[iPdc])
-                self.hscatterTcr[iPdc].set_offsets(np.c_[self.spadIdx, self.spadTcr[iPdc]])
+                self.tcrOffsets[:, 1] = self.spadTcr[iPdc]
+                self.hscatterTcr[iPdc].set_offsets(self.tcrOffsets)
 
                 # update histo
                 avg = np.mean(self.spadPop[iPdc])
-                med = statistics.median(self.spadPop[iPdc])
+                med = sortedMedian(self.spadPop[iPdc])
                 self.linePopu[iPdc].set_label(s=f"{self.label[iPdc]: <12} {avg: <12.1f} {med: <12.1f}")
                 self.linePopu[iPdc].set_data(np.array(self.spad100[iPdc]),
                                             np.array(self.spadPop[iPdc]))
 
         # cumul of all PDCs
-        avg = np.mean(self.spadCumulHis)
-        med = statistics.median(self.spadCumulHis)
-        self.lineCumul.set_label(s=f"{self.lineCumulLabel: <12} {avg: <12.1f} {med: <12.1f}")
+        avgCumul = np.mean(self.spadCumulHis)
+        medCumul = sortedMedian(self.spadCumulHis)
+        self.lineCumul.set_label(s=f"{self.lineCumulLabel: <12} {avgCumul: <12.1f} {medCumul: <12.1f}")
         self.lineCumul.set_data(np.array(self.spadCumul100),
                                 np.array(self.spadCumulHis))
         # cumul stats lines
-        avgCumul = np.mean(self.spadCumulHis)
         self.lineCumulAvg.set_ydata([avgCumul, avgCumul])
-        medCumul = statistics.median(self.spadCumulHis)
         self.lineCumulMed.set_ydata([medCumul, medCumul])
 
         # set new limits
@@ -477,27 +551,44 @@ class tcrPlotter:
         self.pdcValid[iPdc] = True
 
         # add only valid data
-        self.spadTcr[iPdc][iSpad] = avg
-        self.spadPop[iPdc].append(avg)
-        self.spadPop[iPdc].sort()
-        self.spad100[iPdc] = np.linspace(0, 100.0, len(self.spadPop[iPdc]))
+        self.spadTcr[iPdc, iSpad] = avg
+        self.spadPopBuf[iPdc][self.spadPopN[iPdc]] = avg
+        self.spadPopN[iPdc] += 1
 
-        self.spadCumulHis.append(avg)
-        self.spadCumulHis.sort()
-        self.spadCumul100 = np.linspace(0, 100.0, len(self.spadCumulHis))
+        self.spadCumulBuf[self.spadCumulN] = avg
+        self.spadCumulN += 1
 
         if avg != avgTh:
             # SPAD count is different than threshold
             print(f"{fgColors.red}Disabling SPAD {iSpad} on PDC {iPdc}{fgColors.endc}")
             self.spadEn[iPdc] -= 1
 
+    def sortData(self):
+        """
+        sort the populations with their new values (in place, in C)
+        """
+        for iPdc in range(self.nPdcMax):
+            n = self.spadPopN[iPdc]
+            if len(self.spadPop[iPdc]) != n:
+                self.spadPop[iPdc] = self.spadPopBuf[iPdc][:n]
+                self.spadPop[iPdc].sort()
+                self.spad100[iPdc] = np.linspace(0, 100.0, n)
+
+        n = self.spadCumulN
+        if len(self.spadCumulHis) != n:
+            self.spadCumulHis = self.spadCumulBuf[:n]
+            self.spadCumulHis.sort()
+            self.spadCumul100 = np.linspace(0, 100.0, n)
+
     def saveData(self):
         """
         save data to a CSV file
         """
+        self.sortData()
         dateStr=datetime.datetime.now().strftime("%Y%m%d_%Hh%Mm%S")
         pdcStr=""
-        df = pd.DataFrame()
+        # columns of all PDCs, the DataFrame is built once (shorter columns are padded)
+        cols = {}
         for iPdc in range(0, self.nPdcMax):
             # per PDC data
             if self.pdcValid[iPdc]:
@@ -506,14 +597,11 @@ class tcrPlotter:
                     pdcStr+='_'
                 pdcStr+=f"PDC{iPdc}"
 
-                dfNew = pd.DataFrame(data=self.spadIdx, columns=[f"SPAD_idx{iPdc}"])
-                df = pd.concat([df, dfNew], axis=1)
-                dfNew = pd.DataFrame(data=self.spadTcr[iPdc], columns=[f"SPAD_TCR{iPdc}"])
-                df = pd.concat([df, dfNew], axis=1)
-                dfNew = pd.DataFrame(data=self.spad100[iPdc], columns=[f"SPAD_percent{iPdc}"])
-                df = pd.concat([df, dfNew], axis=1)
-                dfNew = pd.DataFrame(data=self.spadPop[iPdc], columns=[f"SPAD_distribution{iPdc}"])
-                df = pd.concat([df, dfNew], axis=1)
+                cols[f"SPAD_idx{iPdc}"] = pd.Series(self.spadIdx)
+                cols[f"SPAD_TCR{iPdc}"] = pd.Series(self.spadTcr[iPdc])
+                cols[f"SPAD_percent{iPdc}"] = pd.Series(self.spad100[iPdc])
+                cols[f"SPAD_distribution{iPdc}"] = pd.Series(self.spadPop[iPdc])
+        df = pd.DataFrame(cols)
 
         if df.size > 0:
             # if there are data to export
@@ -550,77 +638,125 @@ class tcrPlotter:
         let user interact with a plot while waiting for new data
         """
         #plt.pause(pauseTime)  # steal the focus
-        self.fig.canvas.draw_idle()
-        self.fig.canvas.start_event_loop(pauseTime)
+        canvas = self.fig.canvas
+        if not self.blit:
+            # artists drawn with the figure, full draw when something changed
+            if self.fig.stale:
+                canvas.draw_idle()
+        elif self.fig.stale or self.bg is None:
+            # limits or legend changed: full draw, backgrounds are captured in onDraw
+            canvas.draw_idle()
+        else:
+            # only the data changed: redraw it over the saved backgrounds
+            for ax, bg, artists in zip(self.axes.flat, self.bg, self.animatedArtists()):
+                canvas.restore_region(bg)
+                for artist in artists:
+                    ax.draw_artist(artist)
+                canvas.blit(ax.bbox)
+        canvas.start_event_loop(pauseTime)
+
 
+def sortedMedian(data):
+    """
+    median of sorted data (see tcrPlotter.sortData), nan if empty
+    """
+    n = len(data)
+    if n == 0:
+        return float("nan")
+    if n % 2:
+        return data[n//2]
+    return 0.5*(data[n//2-1] + data[n//2])
 
 def set_lim(ax, data):
     """
     set the limit on ax based on the values
     """
     # flatten 2D array and remove zeroes and negative values
-    dataFlatValid = [val for data1D in data for val in data1D if val > 0]
-    if len(dataFlatValid) == 0:
+    parts = [np.asarray(data1D, dtype=float) for data1D in data if len(data1D) > 0]
+    if len(parts) == 0:
+        return
+    dataFlat = np.concatenate(parts)
+    dataFlatValid = dataFlat[dataFlat > 0]
+    if dataFlatValid.size == 0:
         return
 
-    yMin = min(dataFlatValid)/2.0
-    yMax = max(dataFlatValid)*2.0
-    if (yMin != yMax):
-        # auto limits
+    yMin = float(dataFlatValid.min())/2.0
+    yMax = float(dataFlatValid.max())*2.0
+    if (yMin != yMax) and (ax.get_ylim() != (yMin, yMax)):
+        # auto limits, only when changed (the figure is then fully redrawn)
         ax.set_ylim(yMin, yMax)
 
 # --------------------------------------------------
 # --- Function to get ZPP of each PDC from h5 file
 # --------------------------------------------------
-def waitForH5File(timeOutSec=10):
+def waitForH5File(db, timeOutSec=10):
     """
-    function to wait for a new HDF5 file
+    function to wait for a new HDF5 file with the reader db
     """
-    t0 = datetime.datetime.now()
+    deadline = time.monotonic() + timeOutSec
+    dirStamp = None
+    lastScan = 0
     while 1:
-        db = h5Reader(deleteAfter=True,
-                      hfAbsPath=zynq.h5Path,
-                      hfFile="")
-
-        if db.newFileReady():
-            return db
-        else:
-            if datetime.datetime.now()-t0 > datetime.timedelta(seconds=timeOutSec):
-                print(f"{fgColors.red}ERROR: Timeout while waiting for HDF5 data ({timeOutSec} seconds){fgColors.endc}")
-                sys.exit()
+        # listing the files reads the whole directory, skip it while the directory is unchanged
+        # (a file created, renamed or deleted changes its mtime)
+        try:
+            newStamp = os.stat(zynq.h5Path).st_mtime_ns
+        except OSError:
+            newStamp = None
+        now = time.monotonic()
+        if newStamp is None or newStamp != dirStamp or now - lastScan >= H5_RESCAN_PRD:
+            dirStamp = newStamp
+            lastScan = now
+            if db.hasNewFile():
+                return db
+
+        if now > deadline:
+            print(f"{fgColors.red}ERROR: Timeout while waiting for HDF5 data ({timeOutSec} seconds){fgColors.endc}")
+            sys.exit()
+        time.sleep(H5_POLL_PRD)
 
-def measTrgRate(iPix, measTime, numPdc):
+def startPixel(iPix, measTime, sshPool):
     """
-    measTrgRate: send cmd and cfg to Controller and PDC to get the TRG count rate
+    startPixel: send cmd and cfg to Controller and PDC to measure the TRG count rate of a pixel
     1- enable pixels, one at the time
     2- reset ZPP module
     3- wait for measTime for stats to build up
     4- send a Controller data packet with ZPP data
+    the commands are sent in background, returns the future of the transfer
+    """
+    # NOTE: the commands of a pixel are sent together in a single remote shell,
+    #       they are executed in order on the Zynq
+    return sshPool.submit(client.runBatch,
+                          [f"pdcPix --dis --index {iPix} --mode NONE",
+                           "ctlCmd -c MODE_TRG",
+                           "ctlCmd -c RSTN_ZPP",
+                           "sleep 0.001",
+                           f"ctlCfg -a TRGN -r 0x{0x8000+N_TRG:04x}",
+                           f"sleep {measTime:.6f}",
+                           "ctlCmd -c MODE_ACQ",
+                           "ctlCmd -c PACK_TRG_A"])
+
+def finishPixel(iPix, pending, numPdc, db):
+    """
+    finishPixel: get the TRG count of a pixel started with startPixel
     5- wait to receive the file, fetch the ZPP data and close it
     """
-    client.runPrint(f"pdcPix --dis --index {iPix} --mode NONE")
-    N_SPAD = [1]*numPdc
-
-    client.runPrint("ctlCmd -c MODE_TRG")
-    client.runPrint("ctlCmd -c RSTN_ZPP")
-    time.sleep(0.001)
-    client.runSleep(f"ctlCfg -a TRGN -r 0x{0x8000+N_TRG:04x}", msSleep=measTime)
-    client.runPrint("ctlCmd -c MODE_ACQ")
-    client.runPrint("ctlCmd -c PACK_TRG_A")
+    # commands of the pixel are all executed
+    pending.result()
 
     # wait for the HDF5 result file
-    db = waitForH5File()
+    waitForH5File(db)
     db.h5Open()
 
     # get ZPP results
     TOT = [-1]*numPdc
-    for iPdc in range(0, numPdc):
-        ZPP = db.getPdcZPP(iPdc=iPdc, zppSingle=PDC_ZPP_ITEM.TOT)
+    for iPdc, ZPP in enumerate(db.getAllPdcZPP(nPdc=numPdc, zppSingle=PDC_ZPP_ITEM.TOT)):
         if (ZPP != None) and (ZPP.TOT != -1):
             # use ZPP value and normalize count rate to 1 sec to have cps
             TOT[iPdc] = ZPP.TOT
             print(f"  PDC {iPdc}, PIXEL {iPix}, TOT = {TOT[iPdc]}")
 
+    # the file is deleted here, before the next pixel is started
     db.h5Close()
 
     return TOT
@@ -648,20 +784,33 @@ try:
     sectionPrint("Pixel responsiveness logic")
 
     # 1 - loop for each pixel to get its number of triggers and list pixels to disable
-    for iPix in range(0, icp.nSpad, pixStep):
-        TOT = measTrgRate(iPix=iPix,
-                          measTime=measTime,
-                          numPdc=icp.nPdcMax)
-        for iPdc in range(0, icp.nPdcMax):
-            # put new data into data object
-            tp.newData(iPdc, iPix, TOT[iPdc], N_TRG)
-
-            # update plot (using updatePlot here will update for each PDC)
-            # It takes test time on each plot update
-            #tp.updatePlot(iPdc=iPdc)
-
-        # update plot (once per measure for all the PDCs)
-        tp.updatePlot()
+    # NOTE: the next pixel is measured on the Zynq while the plot of the current one is updated,
+    #       the SSH client is only used by the background thread
+    pixels = range(0, icp.nSpad, pixStep)
+    # reader of the result files, reused for all the pixels
+    h5db = h5Reader(deleteAfter=True,
+                    hfAbsPath=zynq.h5Path,
+                    hfFile="")
+    with ThreadPoolExecutor(max_workers=1) as sshPool:
+        if len(pixels) > 0:
+            pending = startPixel(iPix=pixels[0], measTime=measTime, sshPool=sshPool)
+        for iNext, iPix in enumerate(pixels, start=1):
+            TOT = finishPixel(iPix=iPix,
+                              pending=pending,
+                              numPdc=icp.nPdcMax,
+                              db=h5db)
+            if iNext < len(pixels):
+                pending = startPixel(iPix=pixels[iNext], measTime=measTime, sshPool=sshPool)
+            for iPdc in range(0, icp.nPdcMax):
+                # put new data into data object
+                tp.newData(iPdc, iPix, TOT[iPdc], N_TRG)
+
+                # update plot (using updatePlot here will update for each PDC)
+                # It takes test time on each plot update
+                #tp.updatePlot(iPdc=iPdc)
+
+            # update plot (once per measure for all the PDCs)
+            tp.updatePlot()
 
     # 2- Number of good pixel per PDC
     sectionPrint("Number of good pixel per PDC")
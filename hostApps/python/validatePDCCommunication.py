@@ -20,22 +20,52 @@ from modules.zynqDataTransfer import zynqDataTransfer
 from modules.systemHelper import sectionPrint
 import unittest
 import numpy as np
-import os, sys
 
-def printTestName():
+# samples checked at once by constantStep, bounds the memory of the int64 differences
+STEP_CHUNK = 1 << 20
+
+def constantStep(data, chunk=STEP_CHUNK):
     """
-    printTestName: print name of calling test function
+    constantStep: True if the step between all the consecutive samples of data is the same
+    the differences are computed by chunks, stopping at the first wrong one
     """
-    frame = sys._getframe( 1 )
-    print(f"\n{fgColors.green}===== {os.path.basename( frame.f_code.co_name )} ====={fgColors.endc}")
+    if data.size < 2:
+        return False
+    step0 = np.int64(data[1]) - np.int64(data[0])
+    for start in range(0, data.size - 1, chunk):
+        if not np.all(np.diff(data[start:start + chunk + 1].astype(np.int64)) == step0):
+            return False
+    return True
 
 # Runner for Head 2x2
 class Head2x2TestRunner(unittest.TestCase):
+    # fixed configuration of the tests, built once when the class is loaded
+    FSM_CONFIG = {
+        "TOUT": 0x53FF, # Timeout: 
+        "FEND": 0x8200, # FSM end enable, mode and delay
+        "FTX1": 0x0080, # 
+        "FTX0": 0x8600,
+        "ATX1": 0x0000,
+        "ATX0": 0x0000,
+        "SLW1": 0x0000,
+        "SLW0": 0x0000,
+        "FST1": 0x0080,
+        "FST0": 0x8600,
+        "FACQ": 0x0007,
+        "FSMM": 0x0111 
+    }
+    # pdcCfg commands of the PDC settings (TIME is not part of them)
+    PDC_CFG_CMD = pdc_setting(PIXL=0x1102,
+                              TIME=setPdcTimeReg(hold=150, rech=10,flag=4),
+                              DBGC=0x8000,
+                              FIFO=0x117f,
+                              DTXC=0x00cc).apply(session=str)
 
     @classmethod
     def setUpClass(cls) -> None:
         sectionPrint("open a connection with the ZCU102 board")
-        cls.client = sshClientHelper.sshClientFromCfg(hostCfgName="zcudev")
+        # session shared with the other test classes run by the same process
+        cls.client = sshClientHelper.sharedClientFromCfg(hostCfgName="zcudev")
         
         sectionPrint("intialise zynq for data transfers")
         cls._zynqDataTx = zynqDataTransfer(sshClientZynq=cls.client)
@@ -47,10 +77,21 @@ class Head2x2TestRunner(unittest.TestCase):
         cls.pdc_en = 0b1111
         #cls.client = cls.client
         cls.ctlCfg = initCtlPdcFromClient(client=cls.client, sysClkPrd=10e-9, pdcEn=cls.pdc_en)
-        cls.ctlCfg.setSysClkPrd()
+        # NOTE: the controller commands are queued, the configuration is sent by _apply_config
+        #       and startFSM at the end of the block, reads send the commands queued before them
+        with cls.ctlCfg.batch():
+            cls.ctlCfg.setSysClkPrd()
+
+            cls._apply_config()
+            cls.ctlCfg.startFSM()
 
-        cls._apply_config()
-        cls.ctlCfg.startFSM()
+        # the HDF5 file is opened once for all the tests, test_00 checks the result
+        # Expect: an HDF5 file is produced within 20 seconds
+        if cls._reader.hfFile == "":
+            cls._reader.waitForNewFile(timeout_sec=20)
+        if cls._reader.hfFile != "" and cls._reader.h5Open() and cls._reader.h5GetCtl():
+            # statuses and digital sums of the tests loaded in memory in a single pass
+            cls._reader.slurpCtl(groups=("PDC_STATUS_ALL", "PDC"))
         return super().setUpClass()
         
     
@@ -67,76 +108,77 @@ class Head2x2TestRunner(unittest.TestCase):
         
         return super().tearDown()
     
+    def printTestName(self):
+        """
+        printTestName: print name of the running test function
+        """
+        print(f"\n{fgColors.green}===== {self._testMethodName} ====={fgColors.endc}")
+
     @classmethod
     def _apply_config(cls, delay=300):
-        # Given: an initial configuration for the controller 
-        cls.ctlCfg.resetCtl()
-        cls.ctlCfg.pdcEnUser = cls.pdc_en # Enable all 4 PDCs
-
-        cls.ctlCfg.setCtlPacket(bank=packetBank.BANKA,
-            SCS=0x7107, # Send all config to all PDC, get back status
-            SCD=0x0000,
-            SPD=0x0100) # 
-        fsm_config = {
-            "TOUT": 0x53FF, # Timeout: 
-            "FEND": 0x8200, # FSM end enable, mode and delay
-            "FTX1": 0x0080, # 
-            "FTX0": 0x8600,
-            "ATX1": 0x0000,
-            "ATX0": 0x0000,
-            "SLW1": 0x0000,
-            "SLW0": 0x0000,
-            "FST1": 0x0080,
-            "FST0": 0x8600,
-            "FACQ": 0x0007,
-            "FSMM": 0x0111 
-        }
-        cls.ctlCfg.setDelay(signal="CFG_DATA", delay=delay)
-        cls.ctlCfg.setCfgRtnEn()
-        cls.ctlCfg.setupFSM(fsm_config)
-        cls.ctlCfg.preparePDC()
-
-        ### Configure PDCs
-        current_pdc_setting = pdc_setting()
-        pdc_setting.TIME =  setPdcTimeReg(hold=150, rech=10,flag=4)
-        current_pdc_setting.PIXL = 0x1102
-        current_pdc_setting.DBGC = 0x8000
-        current_pdc_setting.FIFO = 0x117f
-        current_pdc_setting.DTXC = 0x00cc
-        cls.ctlCfg.setCtlMode("MODE_CFG")
-        current_pdc_setting.apply(session=cls.client.runPrint)
-
-        # Then:
-        ### Put PDCs in acquisition mode and start acquistion
-        cls.ctlCfg.setCtlMode("MODE_ACQ")
+        # NOTE: the commands are queued in the block (also in the batch of setUpClass)
+        #       and sent together by the flush below
+        with cls.ctlCfg.batch():
+            # Given: an initial configuration for the controller 
+            cls.ctlCfg.resetCtl()
+            cls.ctlCfg.pdcEnUser = cls.pdc_en # Enable all 4 PDCs
+
+            cls.ctlCfg.setCtlPacket(bank=packetBank.BANKA,
+                SCS=0x7107, # Send all config to all PDC, get back status
+                SCD=0x0000,
+                SPD=0x0100) # 
+            cls.ctlCfg.setDelay(signal="CFG_DATA", delay=delay)
+            cls.ctlCfg.setCfgRtnEn()
+            cls.ctlCfg.setupFSM(cls.FSM_CONFIG)
+            cls.ctlCfg.preparePDC()
+
+            ### Configure PDCs
+            cls.ctlCfg.setCtlMode("MODE_CFG")
+            cls.ctlCfg.run(cls.PDC_CFG_CMD)
+
+            # Then:
+            ### Put PDCs in acquisition mode and start acquistion
+            cls.ctlCfg.setCtlMode("MODE_ACQ")
+            # sent here, even inside an outer batch, the configuration is applied when completed
+            cls.ctlCfg.flush()
 
         sectionPrint("_apply_config completed")
 
         return True     
 
     def test_00_h5file_produced(self):
-        printTestName()
+        self.printTestName()
         print("Verify digital sum output through debug counter")
         
-        # Expect: an HDF5 file is produced within 20 seconds
-        if self._reader.hfFile == "":
-            self.assertNotEqual(self._reader.waitForNewFile(timeout_sec=20), "")
-        self.assertTrue(self._reader.h5Open())
-        self.assertTrue(self._reader.h5GetCtl())
+        # HDF5 file opened by setUpClass
+        self.assertNotEqual(self._reader.hfFile, "")
+        self.assertIsNotNone(self._reader.h5)
+        self.assertIsNotNone(self._reader.HDF_CTL)
 
     def test_01_status_ok(self):
-        printTestName()
-        for iPDC in range(self.ctlCfg.nPdcEnUser):
-            with self.subTest(PDC=iPDC):    
-                status = self._reader.HDF_CTL.get(f"PDC_STATUS_ALL/PDC_0{iPDC}")[0]
-                self.assertIn(status, (177,241))
+        self.printTestName()
+        # status of all the PDCs, read before the checks
+        self.assertIsNotNone(self._reader.HDF_CTL.get("PDC_STATUS_ALL"))
+        names = [f"PDC_STATUS_ALL/PDC_0{iPDC}" for iPDC in range(self.ctlCfg.nPdcEnUser)]
+        status = self._reader.readMany(names)
+        missing = [iPDC for iPDC, name in enumerate(names) if status[name] is None]
+        self.assertEqual(missing, [], f"Failed PDC {missing}: no status found")
+        # single check of all the PDCs, the failing ones are listed
+        status = np.array([status[name][0] for name in names])
+        bad = np.flatnonzero(~np.isin(status, (177,241)))
+        self.assertEqual(bad.size, 0, f"Failed PDC {bad.tolist()}: status {status[bad].tolist()} not in (177, 241)")
     
     def test_02_dbg_cnt_value_ok(self):
-        printTestName()
-        for iPDC in range(self.ctlCfg.nPdcEnUser):
-            with self.subTest(PDC=iPDC):
-                [bin, data] = self._reader.getPdcDsum(iPDC)
-                self.assertEqual(len(set(np.gradient(data))), 1, f"Failed PDC {iPDC}: gradient is not 1 across debug counter")
+        self.printTestName()
+        # digital sums of all the PDCs, loaded in memory by setUpClass
+        names = [f"PDC/PDC_{iPDC:02d}/PDC_DATA/DGTL_SUM/DGTL_SUM" for iPDC in range(self.ctlCfg.nPdcEnUser)]
+        dsum = self._reader.readMany(names)
+        missing = [iPDC for iPDC, name in enumerate(names) if dsum[name] is None]
+        self.assertEqual(missing, [], f"Failed PDC {missing}: no DGTL_SUM found")
+        # constant step between all the samples (as a single value of np.gradient),
+        # the failing PDCs are listed
+        bad = [iPDC for iPDC, name in enumerate(names) if not constantStep(dsum[name])]
+        self.assertEqual(bad, [], f"Failed PDC {bad}: gradient is not 1 across debug counter")
     
 
     
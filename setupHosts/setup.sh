@@ -7,6 +7,8 @@ PYTHON_VENV_PATH=$PROJECT_PATH/venv_pdcv2
 ZYNQ_USER=zynq # TBD
 SUBNET_PREFIX="102.180.0"
 USER_DATA_DIR=~/PDCv2-data
+# socket of the shared ssh connection, defined once in the python helper (SSH_SHARED_CONTROL_PATH)
+SSH_CONTROL_PATH=$(sed -n 's/^SSH_SHARED_CONTROL_PATH = "\(.*\)"$/\1/p' $PROJECT_PATH/hostApps/python/modules/sshClientHelper.py)
 
 function print_usage {
 echo "Run this script to setup your host PC to communicate with your devkit."
@@ -82,6 +84,19 @@ function python_env_creation {
 python3.9 -m venv $PYTHON_VENV_PATH
 . $PYTHON_VENV_PATH/bin/activate
 pip install -r $PROJECT_PATH/hostApps/python/requirements.txt
+
+# OS family used by the python modules, avoids detecting it at each import
+if [ -f "/etc/debian_version" ]; then # Running on Debian based OS
+    OS_FAMILY=debian
+elif [ -f "/etc/redhat-release"  ]; then
+    OS_FAMILY=redhat
+fi
+if [ -n "$OS_FAMILY" ]; then
+cat > $PROJECT_PATH/hostApps/python/modules/_env_const.py <<- EOL
+# generated by setupHosts/setup.sh, do not edit
+OS_FAMILY = "$OS_FAMILY"
+EOL
+fi
 }
 
 # 6. Setup ethernet static IP on target interfaces
@@ -111,6 +126,10 @@ Host zcudev
   HostName $SUBNET_PREFIX.16
   User $ZYNQ_USER
   IdentityFile ~/.ssh/id_rsa_zcu
+  ControlMaster auto
+  ControlPath $SSH_CONTROL_PATH
+  ControlPersist 30m
+  GSSAPIAuthentication no
 EOL
 fi
 